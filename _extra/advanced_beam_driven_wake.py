@@ -10,9 +10,14 @@
 
 
 import math 
+import os
 import numpy as np
 import scipy.constants
 
+# When the namelist is only read to analyse the results (see analysis_mode.py),
+# the bunch macro-particles are not generated
+analysis_mode       = bool( os.environ.get("SMILEI_ANALYSIS") )
+
 ##### Physical constants
 lambda0             = 333.89e-6                 # reference length, m - here it will be our plasma wavelength
 c                   = scipy.constants.c         # lightspeed, m/s
@@ -100,12 +105,13 @@ end_plateau    = begin_plateau+Lplateau
 end_downramp   = end_plateau+Ldownramp
 
 ##### plasma density profile
-longitudinal_profile      = polygonal(xpoints=[begin_upramp,begin_plateau,end_plateau,end_downramp],xvalues=[0.,n0,n0,0.])
+longitudinal_xpoints      = [begin_upramp,begin_plateau,end_plateau,end_downramp]
+longitudinal_xvalues      = [0.,n0,n0,0.]
+longitudinal_profile      = polygonal(xpoints=longitudinal_xpoints,xvalues=longitudinal_xvalues)
+# written with numpy functions, so that Smilei can evaluate it on the arrays of positions of a whole patch
 def plasma_density(x,r):
-	profile_r = 0.
-	if ((r)**2<Radius_plasma**2):
-		profile_r = 1.
-	return profile_r*longitudinal_profile(x,r)
+	profile_r = np.where((r)**2<Radius_plasma**2, 1., 0.)
+	return profile_r*np.interp(x, longitudinal_xpoints, longitudinal_xvalues, left=0., right=0.)
 
 ####### define the plasma electrons
 Species(
@@ -140,21 +146,32 @@ normalized_species_charge  = -1                              # For electrons
 Q_part                     = Q_bunch/npart                   # charge for every macroparticle in the electron bunch
 weight                     = Q_part/((c/omega0)**3*ncrit*normalized_species_charge)
 
+bunch_seed                 = 0                               # seed of the random numbers: the bunch is the same at each execution
+
 #### initialize the bunch using numpy arrays
 #### the bunch will have npart particles, so an array of npart elements is used to define the x coordinate of each particle and so on ...
-array_position            = np.zeros((4,npart))              # positions x,y,z, weight
-array_momentum            = np.zeros((3,npart))              # momenta x,y,z
-
-#### The electron bunch is supposed at waist. To make it convergent/divergent, transport matrices can be used
-array_position[0,:]       = np.random.normal(loc=center_bunch, scale=sigma_x, size=npart)                        # generate random number from gaussian distribution for x position
-array_position[1,:]       = np.random.normal(loc=0., scale=sigma_r, size=npart)                                  # generate random number from gaussian distribution for y position
-array_position[2,:]       = np.random.normal(loc=0., scale=sigma_r, size=npart)                                  # generate random number from gaussian distribution for z position
-array_momentum[0,:]       = np.random.normal(loc=gamma_bunch, scale=bunch_energy_spread*gamma_bunch, size=npart) # generate random number from gaussian distribution for px position
-# assumption: bunch defined at waist (zero rms divergence)
-array_momentum[1,:]       = np.random.normal(loc=0., scale=bunch_normalized_emittance/sigma_r, size=npart)       # generate random number from gaussian distribution for py position
-array_momentum[2,:]       = np.random.normal(loc=0., scale=bunch_normalized_emittance/sigma_r, size=npart)       # generate random number from gaussian distribution for pz position
-
-array_position[3,:]       = np.multiply(np.ones(npart),weight)
+def bunch_particles():
+    random_generator      = np.random.default_rng(bunch_seed)
+    array_position        = np.zeros((4,npart))              # positions x,y,z, weight
+    array_momentum        = np.zeros((3,npart))              # momenta x,y,z
+
+    #### The electron bunch is supposed at waist. To make it convergent/divergent, transport matrices can be used
+    array_position[0,:]   = random_generator.normal(loc=center_bunch, scale=sigma_x, size=npart)                        # generate random number from gaussian distribution for x position
+    array_position[1,:]   = random_generator.normal(loc=0., scale=sigma_r, size=npart)                                  # generate random number from gaussian distribution for y position
+    array_position[2,:]   = random_generator.normal(loc=0., scale=sigma_r, size=npart)                                  # generate random number from gaussian distribution for z position
+    array_momentum[0,:]   = random_generator.normal(loc=gamma_bunch, scale=bunch_energy_spread*gamma_bunch, size=npart) # generate random number from gaussian distribution for px position
+    # assumption: bunch defined at waist (zero rms divergence)
+    array_momentum[1,:]   = random_generator.normal(loc=0., scale=bunch_normalized_emittance/sigma_r, size=npart)       # generate random number from gaussian distribution for py position
+    array_momentum[2,:]   = random_generator.normal(loc=0., scale=bunch_normalized_emittance/sigma_r, size=npart)       # generate random number from gaussian distribution for pz position
+
+    array_position[3,:]   = np.multiply(np.ones(npart),weight)
+    return array_position, array_momentum
+
+#### in analysis mode, the initial bunch can still be obtained with S.namelist.bunch_particles()
+if analysis_mode:
+    array_position, array_momentum = None, None
+else:
+    array_position, array_momentum = bunch_particles()
 
 #### define the electron bunch
 Species( 
@@ -0,0 +1,66 @@
+#####################################################################
+### ON-DISK CACHE OF ARRAYS DERIVED FROM SMILEI SIMULATION RESULTS ###
+#####################################################################
+
+# cached_arrays_(results_path, name, compute) returns the arrays computed by compute()
+# from the simulation results in results_path, saved the first time as .npy files and
+# memory-mapped by later calls. The cached arrays are identified by the absolute path
+# of the results & by `name` (which should also describe the parameters of compute),
+# and are recomputed as soon as a file of the results directories is added, removed,
+# or modified (the names, sizes & modification times of the files are compared).
+
+import os, json, hashlib
+from numpy import asarray, save, load
+
+_CACHE_DIR = os.path.join( os.path.expanduser("~"), ".cache", "smilei_tutorials", "analysis" )
+
+
+def _results_signature_( results_path ):
+    # Names, sizes & modification times of the files in the results directories
+    if isinstance(results_path, str):
+        results_path = [ results_path ]
+    signature = []
+    for path in results_path:
+        path = os.path.abspath( path )
+        files = sorted( [entry.name, entry.stat().st_size, entry.stat().st_mtime_ns]
+                        for entry in os.scandir(path) if entry.is_file() )
+        signature.append( [path, files] )
+    return signature
+
+
+def _entry_dir_( signature, name, cache_dir ):
+    key = hashlib.sha1( json.dumps([ [path for path, files in signature], name ]).encode() )
+    return os.path.join( cache_dir or _CACHE_DIR, key.hexdigest()[:24] )
+
+
+def cached_arrays_( results_path, name, compute, cache_dir=None ):
+    # List of the arrays returned by compute() (a sequence of arrays or numbers),
+    # read from the cache when the results have not changed since they were computed
+    signature = _results_signature_( results_path )
+    directory = _entry_dir_( signature, name, cache_dir )
+    index     = os.path.join( directory, 'index.json' )
+
+    # cached arrays, if the results did not change
+    try:
+        with open( index ) as file:
+            entry = json.load( file )
+        if entry['signature'] == signature:
+            return [ load( os.path.join(directory, '%d.npy' % i), mmap_mode='r' ) for i in range(entry['count']) ]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # otherwise, the arrays are computed and saved, the index being written last
+    arrays = [ asarray(a) for a in compute() ]
+    os.makedirs( directory, exist_ok=True )
+    if os.path.exists( index ):
+        os.remove( index )
+    for i, a in enumerate(arrays):
+        tmp = os.path.join( directory, '%d.npy.%d.tmp' % (i, os.getpid()) )
+        with open( tmp, 'wb' ) as file:
+            save( file, a )
+        os.replace( tmp, os.path.join(directory, '%d.npy' % i) )
+    tmp = index + '.%d.tmp' % os.getpid()
+    with open( tmp, 'w' ) as file:
+        json.dump( dict(name=name, count=len(arrays), signature=signature), file )
+    os.replace( tmp, index )
+    return arrays
@@ -0,0 +1,39 @@
+##########################################################################
+### OPENING SIMULATIONS FOR ANALYSIS WITHOUT THEIR HEAVY INITIALIZATION ###
+##########################################################################
+
+# happi executes the namelist of a simulation when opening it. Namelists can skip what is
+# only needed to run the simulation (particle arrays, tabulated profiles, ...) when the
+# environment variable SMILEI_ANALYSIS is set, as advanced_beam_driven_wake.py:
+#
+#     import os
+#     analysis_mode = bool( os.environ.get("SMILEI_ANALYSIS") )
+#
+# open_simulation_ sets this variable while the simulation is opened. It can also be
+# set by hand before starting python (export SMILEI_ANALYSIS=1).
+
+import os
+from contextlib import contextmanager
+
+ANALYSIS_VARIABLE = "SMILEI_ANALYSIS"
+
+
+@contextmanager
+def analysis_mode_():
+    # Namelists executed in this context are in analysis mode
+    previous = os.environ.get( ANALYSIS_VARIABLE )
+    os.environ[ ANALYSIS_VARIABLE ] = "1"
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ[ ANALYSIS_VARIABLE ]
+        else:
+            os.environ[ ANALYSIS_VARIABLE ] = previous
+
+
+def open_simulation_( *args, **kwargs ):
+    # happi.Open, the namelist being executed in analysis mode
+    import happi
+    with analysis_mode_():
+        return happi.Open( *args, **kwargs )
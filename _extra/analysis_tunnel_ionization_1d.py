@@ -4,16 +4,10 @@
 
 simulation_to_analyse = 'tunnel_ionization_1d'
 
-# IMPORT SMILEI's POST-PROCESSING TOOL
-# ------------------------------------
-
-import happi
-
-
 # IMPORT OTHER PYTHON PACKAGES
 # ----------------------------
 
-from numpy import array, pi
+from numpy import pi
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 
@@ -35,24 +29,37 @@ mpl.rcParams.update({
 
 # LOADING SIMULATION & IMPORTANT VARIABLES FROM NAMELIST
 # ------------------------------------------------------
+# The arrays derived from the simulation are kept in a cache (see analysis_cache.py),
+# so that the simulation is only opened when its results have changed
+
+from analysis_cache import cached_arrays_
+from analysis_mode import open_simulation_
+
+S  = None
+def simulation_():
+    global S
+    if S is None:
+        S = open_simulation_(simulation_to_analyse ,verbose=False)
+    return S
 
-S  = happi.Open(simulation_to_analyse ,verbose=False)
+def namelist_variables_():
+    namelist = simulation_().namelist
+    return [ namelist.Lv, namelist.Lp, namelist.Main.timestep, namelist.Species[0].atomic_number,
+             namelist.aL, namelist.Main.reference_angular_frequency_SI ]
 
 t0  = 2.*pi
-Lv  = S.namelist.Lv
-Lp  = S.namelist.Lp
-dt  = S.namelist.Main.timestep
-Zat = S.namelist.Species[0].atomic_number
+Lv, Lp, dt, Zat, aL, w0 = [ v.item() for v in cached_arrays_(simulation_to_analyse, 'namelist', namelist_variables_) ]
 
-print('- vector potential    aL = '+str(S.namelist.aL))
-print('- ref. ang. frequency w0 = '+str(S.namelist.Main.reference_angular_frequency_SI))
+print('- vector potential    aL = '+str(aL))
+print('- ref. ang. frequency w0 = '+str(w0))
 
 
 # SOLVE THE RATE EQUATION NUMERICALLY & PLOT THE RESULTS
 # ------------------------------------------------------
 
-from solve_rate_eqs import solve_rate_eqs_
-t, n, Env = solve_rate_eqs_(S.namelist)
+# (the cache entry also depends on the solver & on the atomic data)
+from solve_rate_eqs import solve_rate_eqs_, solver_hash_
+t, n, Env = cached_arrays_(simulation_to_analyse, 'solve_rate_eqs_'+solver_hash_()[:16], lambda: solve_rate_eqs_(simulation_().namelist))
 
 fig = plt.figure(1); 
 ax = fig.add_axes([0.15, 0.15, 0.8, 0.8])
@@ -69,13 +76,18 @@ plt.show()
 # SIMULATION ANALYSIS & COMPARISON TO RATE EQUATIONS
 # --------------------------------------------------
 
-# read n(Z,t): get the density of each charge state from the ParticleBinning diagnostics
-n    = array( S.ParticleBinning(0).getData() )  
-n00  = n[0,0]
-n    = n/n00
+# read n(Z,t): get the density of each charge state from the ParticleBinning diagnostics,
+# only in the plotted time window (from 4 to 10 optical cycles after centering)
+from particle_binning_reader import read_particle_binning_
+window = [ (4.*t0+Lv+Lp)/dt, (10.*t0+Lv+Lp)/dt ]
+def charge_states_():
+    times, n = read_particle_binning_( simulation_to_analyse, 0, window )
+    n00  = read_particle_binning_( simulation_to_analyse, 0, [0,0] )[1][0,0]
+    return times, n/n00
+times, n = cached_arrays_(simulation_to_analyse, 'charge_states_%g_%g'%tuple(window), charge_states_)
 
 # get corresponding time-steps
-t    = dt * array(S.ParticleBinning(0).get()['times'])
+t    = dt * times
 t    = t - Lv - Lp # centering time axis 
 
 # check conservation
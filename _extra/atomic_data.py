@@ -0,0 +1,57 @@
+#########################################################################
+### IONIZATION POTENTIALS & ANGULAR QUANTUM NUMBERS FOR Z = 1 TO 100  ###
+#########################################################################
+
+# The data is stored in atomic_data.npy, next to this file: a record array holding,
+# for Z = 1 to 100 and for each charge state 0 to Z-1, the ionization potential Ip
+# (in eV) and the angular quantum number l of the electron removed (ground states
+# from the NIST Atomic Spectra Database). The states of element Z are the records
+# Z*(Z-1)/2 to Z*(Z+1)/2-1. The file is memory-mapped the first time an element is
+# requested, so that importing this module costs nothing.
+# atomic_data.npy is built from the plain-text table atomic_data.txt (with its sources):
+#
+#     python atomic_data.py            # checks that atomic_data.npy matches atomic_data.txt
+#     python atomic_data.py --write    # rebuilds atomic_data.npy from atomic_data.txt
+
+import os, sys
+from numpy import load, save, loadtxt, zeros, array_equal
+
+_directory = os.path.dirname(os.path.abspath(__file__))
+_path  = os.path.join( _directory, 'atomic_data.npy' )
+_table = os.path.join( _directory, 'atomic_data.txt' )
+_data  = None
+
+def ionization_data( Z ):
+    # Ionization potentials (in eV) & angular quantum numbers of charge states 0 to Z-1
+    # of the element of atomic number Z, as two arrays of length Z
+    global _data
+    if not 1 <= Z <= 100:
+        raise ValueError('atomic number must be between 1 and 100, not '+str(Z))
+    if _data is None:
+        _data = load( _path, mmap_mode='r' )
+    states = _data[ Z*(Z-1)//2 : Z*(Z+1)//2 ]
+    return states['Ip'], states['l']
+
+
+def read_atomic_table_( table=_table ):
+    # Record array of atomic_data.npy from the plain-text table (columns: Z, element,
+    # charge, Ip in eV, l, ground shells), checking that it holds all the charge states
+    Z, charge, Ip, l = loadtxt( table, usecols=(0,2,3,4), unpack=True )
+    expected = [ (z, q) for z in range(1, 101) for q in range(z) ]
+    if list(zip( Z.astype(int), charge.astype(int) )) != expected:
+        raise ValueError( table+' must list the charge states 0 to Z-1 of Z = 1 to 100, in order' )
+    data = zeros( len(Z), dtype=[('Ip','<f8'), ('l','u1')] )
+    data['Ip'] = Ip
+    data['l']  = l
+    return data
+
+
+if __name__ == "__main__":
+    data = read_atomic_table_()
+    if '--write' in sys.argv[1:]:
+        save( _path, data )
+        print( 'atomic_data.npy rebuilt from atomic_data.txt' )
+    else:
+        same = array_equal( load(_path), data )
+        print( 'atomic_data.npy ' + ('matches' if same else 'DIFFERS FROM') + ' atomic_data.txt' )
+        sys.exit( not same )
@@ -0,0 +1,154 @@
+#
+#  HEADLESS BATCH RENDERING OF THE ANALYSIS SCRIPTS
+#
+
+# Runs analysis scripts without a display (matplotlib Agg backend) and saves their figures
+# instead of showing them:
+#
+#     python batch_render.py [-j PROCESSES] [-f png,pdf] [-o OUTPUT_DIR] script.py ["script.py arg" ...]
+#
+# The scripts are run in parallel, each in its own process. Every call to show() saves the
+# open figures as OUTPUT_DIR/<script>[_<args>]_fig<number>.<format> then closes them, the figures
+# being numbered in the order they are saved over all the calls to show(). Animations (FuncAnimation)
+# are saved as OUTPUT_DIR/<script>_anim<number>.mp4: their frames are drawn in parallel by a
+# pool of PROCESSES processes forked from the script, so that the frame function may use
+# everything the script has loaded, then encoded by ffmpeg (the frames are saved as PNG
+# files when ffmpeg is not available). As frames are drawn independently, the frame
+# function must not depend on the frames drawn before it, as in the tutorial scripts.
+
+import os, sys, shlex, shutil, runpy, argparse, subprocess
+from multiprocessing import get_context, get_all_start_methods, cpu_count
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.animation as animation
+
+_context = get_context( 'fork' if 'fork' in get_all_start_methods() else None )
+
+
+class _RecordedAnimation( object ):
+    # Replaces FuncAnimation in the scripts: the animation is only recorded, to be saved by show()
+    instances = []
+
+    def __init__( self, fig, func, frames=None, init_func=None, fargs=None, interval=200, **kwargs ):
+        if frames is None:
+            frames = kwargs.get('save_count') or 100
+        self.fig      = fig
+        self.func     = func
+        self.frames   = list( range(frames) if isinstance(frames, int) else frames )
+        self.fargs    = fargs or ()
+        self.interval = interval
+        if init_func is not None:
+            init_func()
+        _RecordedAnimation.instances.append( self )
+
+
+_animation = None
+
+def _draw_frames_( frames ):
+    # Draws frames (list of (index, frame)) of the animation being rendered, and writes them
+    # in the raw video file at their position, or as PNG files in the frames directory
+    anim, path, raw = _animation
+    with open( path, 'r+b' ) if raw else open( os.devnull, 'wb' ) as video:
+        for index, frame in frames:
+            anim.func( frame, *anim.fargs )
+            if raw:
+                anim.fig.canvas.draw()
+                image = anim.fig.canvas.buffer_rgba()
+                video.seek( index * len(image) )
+                video.write( image )
+            else:
+                anim.fig.savefig( os.path.join(path, 'frame_%06d.png' % index) )
+
+
+def render_animation_( anim, filename, processes=None ):
+    # Saves a recorded animation in filename (mp4), drawing its frames with a pool of processes.
+    # With ffmpeg, the frames are written as raw RGBA images in a temporary file (this avoids
+    # encoding PNG images); otherwise they are saved as PNG files in <filename>_frames/.
+    global _animation
+    processes = processes or cpu_count()
+    frames    = list( enumerate(anim.frames) )
+    raw       = shutil.which('ffmpeg') is not None
+    if raw:
+        anim.fig.canvas.draw()
+        width, height = anim.fig.canvas.get_width_height( physical=True )
+        path = filename + '.rgba'
+        with open( path, 'wb' ) as video:
+            video.truncate( len(frames) * width * height * 4 )
+    else:
+        path = os.path.splitext(filename)[0] + '_frames'
+        shutil.rmtree( path, ignore_errors=True )
+        os.makedirs( path )
+
+    # contiguous blocks of frames for each process
+    size   = -(-len(frames) // processes)
+    blocks = [ frames[i:i+size] for i in range(0, len(frames), size) ]
+    _animation = (anim, path, raw)
+    try:
+        with _context.Pool( processes ) as pool:
+            pool.map( _draw_frames_, blocks, chunksize=1 )
+        if raw:
+            subprocess.check_call([ 'ffmpeg', '-y', '-loglevel', 'error',
+                                    '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', '%dx%d' % (width, height),
+                                    '-framerate', str(1000./anim.interval), '-i', path,
+                                    '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', filename ])
+        else:
+            print('ffmpeg not found: the frames of '+filename+' are saved in '+path)
+    finally:
+        _animation = None
+        if raw:
+            os.remove( path )
+
+
+def _show_( prefix, formats, processes ):
+    # Replaces show() in the scripts: saves the open figures & the recorded animations, then
+    # closes them (as show() does when its windows are closed), so that the next call to show()
+    # saves only the figures created after it, under new numbers
+    saved = dict( figures=0, animations=0 )
+    def show( *args, **kwargs ):
+        animated = [ anim.fig for anim in _RecordedAnimation.instances ]
+        for number in plt.get_fignums():
+            fig = plt.figure( number )
+            if fig in animated:
+                continue
+            saved['figures'] += 1
+            for format in formats:
+                fig.savefig( '%s_fig%d.%s' % (prefix, saved['figures'], format) )
+        for anim in _RecordedAnimation.instances:
+            render_animation_( anim, '%s_anim%d.mp4' % (prefix, saved['animations']), processes )
+            saved['animations'] += 1
+        del _RecordedAnimation.instances[:]
+        plt.close( 'all' )
+    return show
+
+
+def run_script_( script, output_dir='.', formats=('png',), processes=None ):
+    # Runs an analysis script (followed by its command-line arguments),
+    # saving its figures instead of showing them
+    sys.argv = shlex.split( script )
+    name     = '_'.join( [os.path.splitext(os.path.basename(sys.argv[0]))[0]] + sys.argv[1:] )
+    plt.show = _show_( os.path.join(output_dir, name), formats, processes )
+    animation.FuncAnimation = _RecordedAnimation
+    sys.path.insert( 0, os.path.dirname(os.path.abspath(sys.argv[0])) )
+    runpy.run_path( sys.argv[0], run_name='__main__' )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description='Runs analysis scripts without display, saving their figures' )
+    parser.add_argument( 'scripts', nargs='+' )
+    parser.add_argument( '-j', '--processes', type=int, default=None, help='processes drawing the animation frames' )
+    parser.add_argument( '-f', '--formats', default='png', help='comma-separated figure formats (png, pdf, ...)' )
+    parser.add_argument( '-o', '--output-dir', default='.' )
+    args = parser.parse_args()
+    os.makedirs( args.output_dir, exist_ok=True )
+
+    # each script in its own process (these can fork the frame-drawing pools); the functions
+    # are taken from the module batch_render, as runpy replaces the __main__ module
+    import batch_render
+    jobs = [ _context.Process( target=batch_render.run_script_, args=(script, args.output_dir, args.formats.split(','), args.processes) )
+             for script in args.scripts ]
+    for job in jobs:
+        job.start()
+    for job in jobs:
+        job.join()
+    sys.exit( any( job.exitcode != 0 for job in jobs ) )
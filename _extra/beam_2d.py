@@ -8,15 +8,13 @@ nppc = 25        # number of particle-per-cell
 
 Te = 1e-6  # temperature in units of me c^2
 
-# Initial plasma density profile
+# Initial plasma density profile (accepts arrays of positions)
+import numpy as np
 radius = 30.*dx
 x0 = 40.*dx
 y0 = 200.*dx
 def ne(x,y):
-    if (x-x0)**2 + (y-y0)**2 < radius**2:
-        return 1.
-    else:
-        return 0.
+    return np.where( (x-x0)**2 + (y-y0)**2 < radius**2, 1., 0. )
 
 # --------------------------------------
 # SMILEI's VARIABLES (DEFINED IN BLOCKS)
@@ -0,0 +1,132 @@
+##############################################################
+### BEAM-QUALITY STATISTICS STREAMED FROM TRACKPARTICLES   ###
+##############################################################
+
+# beam_statistics_ reads the macro-particles of a TrackParticles diagnostic (with the
+# attributes x, y, z, px, py, pz & w) in chunks, without sorting them, and returns the
+# time series of the weighted statistics of the beam:
+#
+#     stats = beam_statistics_( "/path/to/simulation", species="electronbunch" )
+#     plt.plot( stats["times"], stats["emittance_y"] )
+#
+# Only one chunk of macro-particles is in memory. For each output, the weighted means &
+# centered second moments of the chunks are combined with the pairwise update of Chan et al.,
+# which does not lose precision as the raw sums <v^2>-<v>^2 would for a beam of small spread
+# around a large mean (e.g. its energy). All quantities are in normalized units (x along the
+# propagation axis), except the charge (pC) & the kinetic energies (MeV). The divergences
+# yp = py/px & zp = pz/px, used for the geometric emittances & Twiss parameters, are averaged
+# over the macro-particles with px != 0 only; all the macro-particles count in the other statistics.
+
+import numpy as np
+import scipy.constants as sc
+from analysis_mode import open_simulation_
+
+_VARIABLES = [ "x", "y", "z", "px", "py", "pz", "E" ]   # E: kinetic energy (in units of mc^2)
+_ANGLES    = [ "y", "yp", "z", "zp" ]
+_mc2_MeV   = sc.m_e * sc.c**2 / sc.e / 1e6
+
+
+class _Moments( object ):
+    # Weighted means & centered second moments of the columns of successive chunks
+    def __init__( self, n ):
+        self.weight = 0.
+        self.count  = 0
+        self.mean   = np.zeros( n )
+        self.moment = np.zeros( (n, n) )
+
+    def add( self, w, columns ):
+        # columns: array (n, number of macro-particles), w: their weights
+        weight = w.sum()
+        if weight <= 0.:
+            return
+        mean     = columns @ w / weight
+        centered = columns - mean[:, None]
+        moment   = (centered * w) @ centered.T
+        total    = self.weight + weight
+        delta    = mean - self.mean
+        self.mean   += delta * weight / total
+        self.moment += moment + np.outer( delta, delta ) * self.weight * weight / total
+        self.weight  = total
+        self.count  += len( w )
+
+    def covariance( self ):
+        return self.moment / self.weight if self.weight > 0. else np.full( self.moment.shape, np.nan )
+
+
+def _columns_( chunk ):
+    # Variables & angles of the macro-particles of a chunk, with their weights (rows with NaNs
+    # are ignored, as well as the macro-particles with px = 0 for the angles)
+    px, py, pz = chunk["px"], chunk["py"], chunk["pz"]
+    p2      = px**2 + py**2 + pz**2
+    columns = np.array([ chunk["x"], chunk["y"], chunk["z"], px, py, pz, p2 / (np.sqrt(1. + p2) + 1.) ])
+    w       = np.asarray( chunk["w"], dtype=float )
+    valid   = np.isfinite( w ) & np.isfinite( columns ).all( axis=0 )
+    with np.errstate( divide='ignore', invalid='ignore' ):
+        angles = np.array([ chunk["y"], py/px, chunk["z"], pz/px ])
+    angular = valid & np.isfinite( angles ).all( axis=0 )
+    return (w[valid], columns[:, valid]), (w[angular], angles[:, angular])
+
+
+def _twiss_( cov, i, ip ):
+    # Geometric emittance & Twiss parameters (alpha, beta, gamma) in the plane (i, ip)
+    emittance = np.sqrt( max( cov[i,i]*cov[ip,ip] - cov[i,ip]**2, 0. ) )
+    beta      = cov[i,i] / emittance
+    alpha     = -cov[i,ip] / emittance
+    return emittance, alpha, beta, (1. + alpha**2) / beta
+
+
+def _weight_to_pC_( namelist ):
+    # Charge (pC) of a unit weight of electrons, from the reference frequency of the simulation
+    omega0 = getattr( namelist.Main, 'reference_angular_frequency_SI', 0. )
+    if not omega0:
+        return np.nan
+    ncrit = sc.epsilon_0 * sc.m_e * omega0**2 / sc.e**2
+    return sc.e * ncrit * (sc.c/omega0)**3 * 1e12
+
+
+def beam_statistics_( results_path, species, timesteps=None, chunksize=1000000, simulation=None ):
+    # Dictionary of the time series of the beam statistics of the tracked species:
+    # times, charge, number (macro-particles), centroid & rms sizes, kinetic energy (mean & rms spread),
+    # normalized emittances & Twiss parameters in the planes y & z
+    S     = simulation or open_simulation_( results_path, verbose=False )
+    track = S.TrackParticles( species=species, axes=["x","y","z","px","py","pz","w"],
+                              chunksize=chunksize, sort=False )
+    steps = np.array( track.getAvailableTimesteps() )
+    if timesteps is not None:
+        steps = steps[ (steps >= timesteps[0]) & (steps <= timesteps[-1]) ]
+
+    names = [ "charge", "number", "x", "y", "z", "sigma_x", "sigma_y", "sigma_z", "energy", "energy_spread",
+              "relative_energy_spread" ] + [ "%s_%s" % (q, plane) for plane in "yz"
+              for q in ("emittance", "geometric_emittance", "alpha", "beta", "gamma") ]
+    stats = { name: np.full( len(steps), np.nan ) for name in names }
+    stats["timesteps"] = steps
+    stats["times"]     = steps * S.namelist.Main.timestep
+    weight_to_pC       = _weight_to_pC_( S.namelist )
+    iv = { v: i for i, v in enumerate(_VARIABLES) }
+    ia = { v: i for i, v in enumerate(_ANGLES) }
+
+    for it, step in enumerate(steps):
+        moments = _Moments( len(_VARIABLES) )
+        angular = _Moments( len(_ANGLES) )
+        for chunk in track.iterParticles( step, chunksize=chunksize ):
+            variables, angles = _columns_( chunk )
+            moments.add( *variables )
+            angular.add( *angles )
+        if moments.weight <= 0.:
+            continue
+        mean, cov = moments.mean, moments.covariance()
+        angles_cov = angular.covariance()
+        stats["charge"][it] = moments.weight * weight_to_pC
+        stats["number"][it] = moments.count
+        for v in "xyz":
+            stats[v][it]          = mean[iv[v]]
+            stats["sigma_"+v][it] = np.sqrt( cov[iv[v], iv[v]] )
+        stats["energy"][it]                 = mean[iv["E"]] * _mc2_MeV
+        stats["energy_spread"][it]          = np.sqrt( cov[iv["E"], iv["E"]] ) * _mc2_MeV
+        stats["relative_energy_spread"][it] = stats["energy_spread"][it] / stats["energy"][it]
+        for plane in "yz":
+            i, ip = iv[plane], iv["p"+plane]
+            stats["emittance_"+plane][it] = np.sqrt( max( cov[i,i]*cov[ip,ip] - cov[i,ip]**2, 0. ) )
+            ( stats["geometric_emittance_"+plane][it], stats["alpha_"+plane][it],
+              stats["beta_"+plane][it], stats["gamma_"+plane][it] ) = _twiss_( angles_cov, ia[plane], ia[plane+"p"] )
+    return stats
@@ -0,0 +1,184 @@
+#
+#  BENCHMARK & ACCURACY OF THE RATE EQUATION SOLVERS (Tutorial 4)
+#
+
+# Run time & maximum population error of the variants of solve_rate_eqs_ for a matrix
+# of elements, laser intensities & pulse durations, in the configuration of
+# tunnel_ionization_1d.py. The errors are computed against the Crank-Nicolson solution
+# ("vectorized"), and against the charge-state curves of PIC simulations saved by
+# save_pic_curves_. The results are printed and written in a json file.
+
+results_file = 'benchmark_rate_eqs.json'
+
+elements    = [ 1, 6, 10 ]            # atomic numbers
+intensities = [ 1.e-2, 5.e-2, 2.e-1 ] # in units of 1e18 W/cm^2 (for Lmu = 0.8)
+durations   = [ 5., 20. ]             # fwhm of the gaussian time envelope, in optical cycles
+repeat      = 3                       # the best time of `repeat` runs is kept
+scalar_max_size = 2.e6                # the scalar solver is timed only up to (Zat+1)*nt = scalar_max_size
+
+# PIC charge-state curves: list of files saved by save_pic_curves_ (see below)
+pic_curves  = []
+
+
+import io, json, math, time, contextlib
+from math import pi, sqrt
+from numpy import array, interp, load, savez
+from solve_rate_eqs import solve_rate_eqs_, solve_rate_eqs_scalar_
+
+
+# NAMELISTS
+# ---------
+
+class _Block( object ):
+    def __init__( self, **kwargs ):
+        self.__dict__.update( kwargs )
+
+def _gaussian_profile_( start, duration, sigma, center, order ):
+    # Smilei time profile tgaussian, with the attributes it stores
+    def f(t):
+        if t < start: return 0.
+        elif t < start+duration: return math.exp( -(t-center)**order / sigma )
+        else: return 0.
+    f.profileName = "tgaussian"
+    f.start       = start
+    f.duration    = duration
+    f.sigma       = sigma
+    f.center      = center
+    f.order       = order
+    return f
+
+def _tgaussian_( start=0., duration=None, fwhm=None, center=None, order=2 ):
+    # same as the Smilei time profile tgaussian
+    if duration is None: duration = float("inf")
+    if fwhm     is None: fwhm     = duration/3.
+    if center   is None: center   = start+duration/2.
+    sigma = (0.5*fwhm)**order/math.log(2.0)
+    return _gaussian_profile_( start, duration, sigma, center, order )
+
+def tutorial_namelist_( atomic_number=6, I18=5.e-2, fwhm=5., Lmu=0.8 ):
+    # Parameters read by the solvers, as in tunnel_ionization_1d.py
+    # (the pulse duration fwhm is in optical cycles)
+    l0   = 2.*pi
+    t0   = l0
+    rest = 64./0.95
+    Lv   = 2.*l0
+    Lp   = l0/32.
+    tmax = 4.*fwhm*t0
+    aL   = sqrt(I18*Lmu**2/1.38)
+    return _Block(
+        Main    = _Block( timestep = t0/rest, simulation_time = Lv+Lp+tmax,
+                          reference_angular_frequency_SI = 2.*pi * 3.e8/(Lmu*1.e-6) ),
+        Laser   = [ _Block( space_envelope = [0., aL], delay_phase = [0., 0.], omega = 1.,
+                            time_envelope = _tgaussian_(start=0., fwhm=fwhm*t0, center=Lv+tmax/2.) ) ],
+        Species = [ _Block( atomic_number = atomic_number, charge = 0. ) ],
+    )
+
+
+# SOLVERS & ERRORS
+# ----------------
+
+# the first variant is the reference
+variants = {
+    "vectorized" : lambda namelist: solve_rate_eqs_( namelist ),
+    "scalar"     : lambda namelist: solve_rate_eqs_scalar_( namelist ),
+    "exponential": lambda namelist: solve_rate_eqs_( namelist, integrator="exponential" ),
+    "envelope"   : lambda namelist: solve_rate_eqs_( namelist, model="tunnel_envelope_averaged" ),
+    "table"      : lambda namelist: solve_rate_eqs_( namelist, rate_table=True ),
+}
+
+def time_variant_( variant, namelist, repeat=1 ):
+    # Best run time (in s) & result (t, n, Env) of a solver variant
+    best = float('inf')
+    for i in range(repeat):
+        with contextlib.redirect_stdout( io.StringIO() ):
+            start  = time.perf_counter()
+            result = variants[variant]( namelist )
+            best   = min( best, time.perf_counter() - start )
+    return best, result
+
+def population_errors_( t, n, t_ref, n_ref ):
+    # Maximum difference (over time & charge states) of the populations n(t) & n_ref(t_ref),
+    # n_ref being interpolated on the times t, and maximum difference of the final populations.
+    # n & n_ref have shapes (Zat+1, len(t)) & (Zat+1, len(t_ref)).
+    nZ = min( len(n), len(n_ref) )
+    n_interp = array([ interp(t, t_ref, n_ref[Z]) for Z in range(nZ) ])
+    return float( abs(n[:nZ] - n_interp).max() ), float( abs(n[:nZ,-1] - n_ref[:nZ,-1]).max() )
+
+
+# PIC CURVES
+# ----------
+
+def save_pic_curves_( simulation, filename ):
+    # Saves the charge-state populations n(t) of a tunnel ionization simulation
+    # (ParticleBinning(0) as in analysis_tunnel_ionization_1d.py) with its parameters
+    # (the tgaussian time envelope is saved with the attributes Smilei stores, fwhm not being one of them)
+    import happi
+    S  = happi.Open( simulation, verbose=False )
+    n  = array( S.ParticleBinning(0).getData() )
+    t  = S.namelist.Main.timestep * array( S.ParticleBinning(0).get()['times'] )
+    laser   = S.namelist.Laser[0]
+    species = S.namelist.Species[0]
+    savez( filename,
+           t = t - S.namelist.Lv - S.namelist.Lp, n = (n/n[0,0]).T,
+           timestep = S.namelist.Main.timestep, simulation_time = S.namelist.Main.simulation_time,
+           reference_angular_frequency_SI = S.namelist.Main.reference_angular_frequency_SI,
+           aL = max(laser.space_envelope),
+           **{ name: getattr(laser.time_envelope, name) for name in ('start', 'duration', 'sigma', 'center', 'order') },
+           atomic_number = species.atomic_number )
+
+def _pic_namelist_( data ):
+    # Namelist parameters of a simulation saved by save_pic_curves_
+    if 'sigma' in data:
+        envelope = _gaussian_profile_( *[ float(data[name]) for name in ('start', 'duration', 'sigma', 'center', 'order') ] )
+    else:
+        envelope = _tgaussian_( start=0., fwhm=float(data['fwhm']), center=float(data['center']) )   # older files
+    return _Block(
+        Main    = _Block( timestep = float(data['timestep']), simulation_time = float(data['simulation_time']),
+                          reference_angular_frequency_SI = float(data['reference_angular_frequency_SI']) ),
+        Laser   = [ _Block( space_envelope = [0., float(data['aL'])], delay_phase = [0., 0.], omega = 1.,
+                            time_envelope = envelope ) ],
+        Species = [ _Block( atomic_number = int(data['atomic_number']), charge = 0. ) ],
+    )
+
+
+# BENCHMARK
+# ---------
+
+def benchmark_( elements, intensities, durations, pic_curves=[], repeat=1, scalar_max_size=2.e6 ):
+    # List of records {case, variant, time, max_error, final_error}, the errors being
+    # computed against the "vectorized" solution, or against the PIC curves
+    results = []
+    cases = [ (dict(atomic_number=Z, I18=I18, fwhm=fwhm), tutorial_namelist_(Z, I18, fwhm), None)
+              for Z in elements for I18 in intensities for fwhm in durations ]
+    for filename in pic_curves:
+        data = load( filename )
+        cases.append( (dict(pic=filename), _pic_namelist_(data), (data['t'], data['n'].T)) )
+
+    for case, namelist, pic in cases:
+        nt = int( namelist.Main.simulation_time / namelist.Main.timestep )
+        for variant in variants:
+            if variant == "scalar" and (namelist.Species[0].atomic_number+1)*nt > scalar_max_size:
+                continue
+            run_time, (t, n, Env) = time_variant_( variant, namelist, 1 if variant=="scalar" else repeat )
+            record = dict( case, variant=variant, nt=nt, time=run_time )
+            if variant == "vectorized":
+                reference = (t, n)
+            else:
+                record["max_error"], record["final_error"] = population_errors_( t, n, *reference )
+            if pic is not None:
+                record["max_error_pic"], record["final_error_pic"] = population_errors_( t, n, *pic )
+            results.append( record )
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark_( elements, intensities, durations, pic_curves, repeat, scalar_max_size )
+
+    for record in results:
+        case = ', '.join( '%s=%s' % (k, record[k]) for k in ('atomic_number', 'I18', 'fwhm', 'pic') if k in record )
+        print( '%-40s %-12s %10.4f s' % (case, record['variant'], record['time'])
+               + ''.join( '   %s=%.2e' % (k, record[k]) for k in ('max_error', 'final_error', 'max_error_pic', 'final_error_pic') if k in record ) )
+
+    with open( results_file, 'w' ) as file:
+        json.dump( results, file, indent=1 )
+    print('- results written in '+results_file)
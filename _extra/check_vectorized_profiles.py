@@ -0,0 +1,286 @@
+#
+#  CHECK OF THE VECTORIZED DENSITY PROFILES OF THE NAMELISTS
+#
+
+# The density profiles of the namelists are written with numpy functions (np.where,
+# np.interp), so that Smilei evaluates them once per patch on arrays of positions instead
+# of once per cell. This script executes the namelists with the stub blocks of
+# diagnostic_volume.py and compares their profiles, called on arrays and on single
+# positions, with the scalar versions they replaced, at random positions and at the
+# edges of the plasma. It also checks that the time profiles built as in Smilei are evaluated
+# on arrays by the analytic versions of solve_rate_eqs.py (and not by its np.vectorize fallback):
+#
+#     python check_vectorized_profiles.py
+
+import os, sys, math
+import numpy as np
+from diagnostic_volume import read_namelist_
+from solve_rate_eqs import _TIME_PROFILES
+
+_points = 100000
+
+
+# SCALAR VERSIONS (as written before in the namelists)
+# ----------------------------------------------------
+
+def _polygonal_( xpoints, xvalues ):
+    # Scalar polygonal profile of Smilei (zero outside of the points)
+    def f( x, *args ):
+        if x < xpoints[0]:
+            return 0.
+        for i in range( 1, len(xpoints) ):
+            if x < xpoints[i]:
+                return xvalues[i-1] + (xvalues[i]-xvalues[i-1]) / (xpoints[i]-xpoints[i-1]) * (x-xpoints[i-1])
+        return 0.
+    return f
+
+def _nplasma_( nl ):
+    longitudinal_profile = _polygonal_( nl["longitudinal_xpoints"], nl["longitudinal_xvalues"] )
+    def nplasma( x, r ):
+        profile_r = 0.
+        if (r<nl["Radius_plasma"]):
+            profile_r = 1.
+        return profile_r*longitudinal_profile(x,r)
+    return nplasma
+
+def _plasma_density_( nl ):
+    longitudinal_profile = _polygonal_( nl["longitudinal_xpoints"], nl["longitudinal_xvalues"] )
+    def plasma_density( x, r ):
+        profile_r = 0.
+        if ((r)**2<nl["Radius_plasma"]**2):
+            profile_r = 1.
+        return profile_r*longitudinal_profile(x,r)
+    return plasma_density
+
+def _ne_( nl ):
+    def ne( x, y ):
+        if (x-nl["x0"])**2 + (y-nl["y0"])**2 < nl["radius"]**2:
+            return 1.
+        else:
+            return 0.
+    return ne
+
+def _n_( nl ):
+    def n_( x ):
+        if (nl["Lv"]<x<nl["Lv"]+nl["Lp"]):
+            return nl["n0"]
+        else:
+            return 0.
+    return n_
+
+def _my_profile_3D_( nl ):
+    def my_profile( x, y, z ):
+        center_plasma = [nl["Lx"]/4.,nl["Ltrans"]/2.,nl["Ltrans"]/2.]
+        Radius = 20.
+        Length = 5.
+        if ((abs(x-center_plasma[0])<Length) and ((y-center_plasma[1])**2+(z-center_plasma[2])**2<Radius*Radius)):
+            return 1.
+        else:
+            return 0.
+    return my_profile
+
+def _my_profile_AM_( nl ):
+    def my_profile( x, r ):
+        center_plasma = nl["Lx"]/4.
+        Radius = 20.
+        Length = 5.
+        if ((abs(x-center_plasma)<Length) and (r<Radius)):
+            return 1.
+        else:
+            return 0.
+    return my_profile
+
+def _my_density_profile_dopant_( nl ):
+    def my_density_profile_dopant( x, r ):
+        radial_profile     = 1.
+        if (r>nl["R_plasma"]) or (x<nl["p_xmin"]/nl["c_over_omega0"]):
+            radial_profile = 0.
+        return radial_profile*nl["dens_func_at1"](x,r)*nl["Prop_N_in_1"]*nl["n_at"]
+    return my_density_profile_dopant
+
+def _density_profile_electrons_( nl ):
+    def density_profile_electrons( x, r ):
+        radial_profile     = 1.
+        if (r>nl["R_plasma"]) or (x<nl["p_xmin"]/nl["c_over_omega0"]):
+            radial_profile = 0.
+        return radial_profile*nl["dens_func_e"](x,r)*nl["n_at"]
+    return density_profile_electrons
+
+def _envelope_plasma_box_( nl ):
+    return [ nl["p_xmax"]/nl["c_over_omega0"]*1.1, 2.*nl["R_plasma"] ]
+
+def _envelope_plasma_edges_( nl ):
+    return [ x/nl["c_over_omega0"] for x in (nl["p_xmin"], nl["xc1"], nl["xc2"], nl["p_xmax"]) ]
+
+
+# (namelist, geometry replacing the one of the namelist, profile name, scalar version,
+#  size of the box along each axis, edges of the plasma along x)
+_CASES = [
+    ( "laser_wake_AM.py",             None,            "nplasma",        _nplasma_,
+      lambda nl: [nl["x_end_plasma"]*1.1, nl["Lr"]],                lambda nl: nl["longitudinal_xpoints"] ),
+    ( "advanced_beam_driven_wake.py", None,            "plasma_density", _plasma_density_,
+      lambda nl: [nl["begin_upramp"]*3., nl["Lr"]],                 lambda nl: nl["longitudinal_xpoints"] ),
+    ( "beam_2d.py",                   None,            "ne",             _ne_,
+      lambda nl: list( nl["Main"].grid_length ),                    lambda nl: [nl["x0"]-nl["radius"], nl["x0"]+nl["radius"]] ),
+    ( "tunnel_ionization_1d.py",      None,            "n_",             _n_,
+      lambda nl: [nl["Lx"]],                                        lambda nl: [nl["Lv"], nl["Lv"]+nl["Lp"]] ),
+    ( "export_VTK_namelist.py",       "3Dcartesian",   "my_profile",     _my_profile_3D_,
+      lambda nl: [nl["Lx"], nl["Ltrans"], nl["Ltrans"]],            lambda nl: [nl["Lx"]/4.-5., nl["Lx"]/4.+5.] ),
+    ( "export_VTK_namelist.py",       "AMcylindrical", "my_profile",     _my_profile_AM_,
+      lambda nl: [nl["Lx"], nl["Ltrans"]],                          lambda nl: [nl["Lx"]/4.-5., nl["Lx"]/4.+5.] ),
+    ( "laser_wake_envelope.py",       None,            "my_density_profile_dopant", _my_density_profile_dopant_,
+      _envelope_plasma_box_,                                        _envelope_plasma_edges_ ),
+    ( "laser_wake_envelope.py",       None,            "density_profile_electrons", _density_profile_electrons_,
+      _envelope_plasma_box_,                                        _envelope_plasma_edges_ ),
+]
+
+
+# TIME PROFILES (as built by pyprofiles.py in Smilei)
+# ---------------------------------------------------
+
+def _smilei_profile_( f, name, **attributes ):
+    f.profileName = name
+    f.__dict__.update( attributes )
+    return f
+
+def _smilei_tconstant_( start=0. ):
+    def f(t):
+        return 1. if t >= start else 0.
+    return _smilei_profile_( f, "tconstant", start=start )
+
+def _smilei_ttrapezoidal_( start=0., plateau=None, slope1=0., slope2=0. ):
+    def f(t):
+        if t < start: return 0.
+        elif t < start+slope1: return (t-start) / slope1
+        elif t < start+slope1+plateau: return 1.
+        elif t < start+slope1+plateau+slope2: return 1. - ( t - (start+slope1+plateau) ) / slope2
+        else: return 0.
+    return _smilei_profile_( f, "ttrapezoidal", start=start, plateau=plateau, slope1=slope1, slope2=slope2 )
+
+def _smilei_tgaussian_( start=0., duration=None, fwhm=None, center=None, order=2 ):
+    if duration is None: duration = float("inf")
+    if fwhm     is None: fwhm     = duration/3.
+    if center   is None: center   = start+duration/2.
+    sigma = (0.5*fwhm)**order/math.log(2.0)
+    def f(t):
+        if t < start: return 0.
+        elif t < start+duration: return math.exp( -(t-center)**order / sigma )
+        else: return 0.
+    return _smilei_profile_( f, "tgaussian", start=start, duration=duration, sigma=sigma, center=center, order=order )
+
+def _smilei_tpolygonal_( points=[], values=[] ):
+    points = [ float(x) for x in points ]
+    values = [ float(x) for x in values ]
+    N      = len(points)
+    slopes = [ (values[i]-values[i-1])/(points[i]-points[i-1]) for i in range(1,N) ]
+    def f(t):
+        if t < points[0]: return values[0]
+        for i in range(1,N):
+            if t < points[i]: return values[i-1] + slopes[i-1] * ( t-points[i-1] )
+        return values[-1]
+    return _smilei_profile_( f, "tpolygonal", points=points, values=values, slopes=slopes )
+
+def _smilei_tcosine_( base=0., amplitude=1., start=0., duration=None, phi=0., freq=1. ):
+    def f(t):
+        if t < start: return 0.
+        elif t < start+duration: return base + amplitude * math.cos( phi + freq*(t-start) )
+        else: return 0.
+    return _smilei_profile_( f, "tcosine", base=base, amplitude=amplitude, start=start, duration=duration, phi=phi, freq=freq )
+
+def _smilei_tpolynomial_( t0=0., **kwargs ):
+    orders = [ int(k[5:]) for k in kwargs ]
+    coeffs = [ kwargs[k] for k in kwargs ]
+    def f(t):
+        r = 0.
+        for order, c in zip(orders, coeffs):
+            r += c * (t-t0)**order
+        return r
+    return _smilei_profile_( f, "tpolynomial", t0=t0, orders=orders, coeffs=coeffs )
+
+def _smilei_tsin2plateau_( start=0., fwhm=0., plateau=None, slope1=None, slope2=None ):
+    if plateau is None: plateau = 0.
+    if slope1  is None: slope1  = fwhm
+    if slope2  is None: slope2  = slope1
+    def f(t):
+        if t < start: return 0.
+        elif (t < start+slope1) and (slope1 != 0.): return math.sin( 0.5*math.pi*(t-start)/slope1 )**2
+        elif t < start+slope1+plateau: return 1.
+        elif t < start+slope1+plateau+slope2 and (slope2 != 0.): return math.cos( 0.5*math.pi*(t-start-slope1-plateau)/slope2 )**2
+        else: return 0.
+    return _smilei_profile_( f, "tsin2plateau", start=start, slope1=slope1, plateau=plateau, slope2=slope2 )
+
+# (description, time profile, times)
+_times = np.linspace( -10., 200., _points )
+_TIME_CASES = [
+    ( "tconstant(start)",                 _smilei_tconstant_( start=20. ),                                   _times ),
+    ( "ttrapezoidal(slopes, plateau)",    _smilei_ttrapezoidal_( start=10., plateau=50., slope1=20., slope2=30. ), _times ),
+    ( "ttrapezoidal(no slopes)",          _smilei_ttrapezoidal_( start=10., plateau=50. ),                    _times ),
+    ( "tgaussian(fwhm, center)",          _smilei_tgaussian_( fwhm=20., center=60. ),                        _times ),
+    ( "tgaussian(duration, order 4)",     _smilei_tgaussian_( start=5., duration=90., order=4 ),             _times ),
+    ( "tpolygonal(3 points)",             _smilei_tpolygonal_( points=[0.,1.,3.], values=[0.,1.,0.5] ),      np.linspace( -1., 4., _points ) ),
+    ( "tpolygonal(5 points)",             _smilei_tpolygonal_( points=[0.,20.,50.,120.,150.], values=[0.2,1.,0.7,0.7,0.] ), _times ),
+    ( "tcosine",                          _smilei_tcosine_( base=0.5, amplitude=0.5, start=10., duration=150., phi=1., freq=0.1 ), _times ),
+    ( "tpolynomial",                      _smilei_tpolynomial_( t0=50., order0=1., order1=-0.01, order2=1.e-4 ), _times ),
+    ( "tsin2plateau(fwhm, plateau)",      _smilei_tsin2plateau_( start=10., fwhm=30., plateau=40. ),         _times ),
+    ( "tsin2plateau(no slopes)",          _smilei_tsin2plateau_( start=10., plateau=40., slope1=0., slope2=0. ), _times ),
+]
+
+def check_time_profile_( f, t ):
+    # Largest difference between the analytic version of a time profile on an array of times
+    # & the profile called at each time (raises if the analytic version cannot read the profile)
+    with np.errstate( all='ignore' ):
+        analytic = _TIME_PROFILES[ f.profileName ]( f, t )
+    expected = np.array([ f(ti) for ti in t ])
+    return np.abs( analytic - expected ).max() / np.abs( expected ).max()
+
+# -----
+
+def _namelist_( filename, geometry ):
+    with open( filename ) as file:
+        source = file.read()
+    if geometry is not None:
+        source = source.replace( 'geometry   = "3Dcartesian"', 'geometry   = "%s"' % geometry, 1 )
+    return read_namelist_( filename, source )
+
+
+def _positions_( box, x_edges, rng ):
+    # Random positions in the box, plus positions at & next to the edges of the plasma along x
+    x_edges   = np.array( x_edges, dtype=float )
+    x_edges   = np.concatenate([ x_edges, np.nextafter(x_edges, -np.inf), np.nextafter(x_edges, np.inf) ])
+    positions = [ rng.uniform( 0., L, _points ) for L in box ]
+    positions[0][:len(x_edges)] = x_edges
+    if len(box) > 1:
+        positions[1][:len(x_edges)] = rng.uniform( 0., 1., len(x_edges) )   # inside the plasma radially
+    return positions
+
+
+def check_( filename, geometry, name, scalar, box, x_edges, seed=0 ):
+    # Largest difference, relative to the largest density, between the vectorized profile
+    # (called on arrays & on single positions) & its scalar version
+    nl         = _namelist_( filename, geometry )
+    vectorized = nl[ name ]
+    scalar     = scalar( nl )
+    positions  = _positions_( box(nl), x_edges(nl), np.random.default_rng(seed) )
+    expected   = np.array([ scalar(*p) for p in zip(*positions) ])
+    on_arrays  = np.asarray( vectorized( *positions ) )
+    one_by_one = np.array([ float( vectorized(*p) ) for p in zip(*positions) ])
+    error      = max( np.abs(on_arrays - expected).max(), np.abs(one_by_one - expected).max() )
+    return error / np.abs(expected).max(), len(expected)
+
+
+if __name__ == "__main__":
+    os.environ["SMILEI_ANALYSIS"] = "1"   # skips the particle arrays of the namelists
+    directory = os.path.dirname( os.path.abspath(__file__) )
+    failed    = False
+    for filename, geometry, name, scalar, box, x_edges in _CASES:
+        error, n = check_( os.path.join(directory, filename), geometry, name, scalar, box, x_edges )
+        ok       = error <= 1e-12
+        failed  |= not ok
+        print( '%-30s %-14s %-25s %7d positions, largest difference %.3g  %s'
+               % (filename, geometry or '', name, n, error, 'OK' if ok else 'FAILED') )
+    for description, f, t in _TIME_CASES:
+        error   = check_time_profile_( f, t )
+        ok      = error <= 1e-12
+        failed |= not ok
+        print( '%-71s %7d times, largest difference %.3g  %s' % (description, len(t), error, 'OK' if ok else 'FAILED') )
+    sys.exit( failed )
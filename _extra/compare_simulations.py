@@ -0,0 +1,53 @@
+###############################################################
+### READING THE SAME DIAGNOSTIC FROM SEVERAL SIMULATIONS     ###
+###############################################################
+
+# Comparison studies run the same namelist with different parameters (e.g. the patch
+# arrangements of radiation_pressure_acc_*.py, or the number of patches of beam_2d.py).
+# read_simulations_ opens the simulations & reads the same diagnostic from all of them
+# in parallel, one process per simulation, and returns the data of the timesteps that
+# all simulations have in common:
+#
+#     timesteps, data = read_simulations_( ["hilbert", "linearized_XY", "linearized_YX"], "Scalar", "Utot" )
+#     for run, d in zip( runs, data ): plt.plot( timesteps, d )
+#
+# data[i] is the diagnostic of the i-th simulation (shape: timesteps x diagnostic shape).
+# Processes are used rather than threads since h5py (used by happi) holds a lock while it
+# reads a file, so that threads read the files one at a time. The simulations are opened
+# in analysis mode (see analysis_mode.py).
+
+import numpy as np
+from functools import reduce
+from multiprocessing import get_context, get_all_start_methods
+from analysis_mode import analysis_mode_
+
+
+def _read_( job ):
+    # Timesteps & data of the diagnostic getattr(S, diagnostic)(*args, **kwargs) of a simulation
+    path, diagnostic, args, kwargs = job
+    import happi
+    with analysis_mode_():
+        S = happi.Open( path, verbose=False )
+    diag = getattr( S, diagnostic )( *args, **kwargs )
+    return np.array( diag.getTimesteps() ), np.array( diag.getData() )
+
+
+def read_simulations_( paths, diagnostic, *args, processes=None, **kwargs ):
+    # (timesteps, data) of a diagnostic of several simulations: data is an array (simulations,
+    # timesteps, ...) on the timesteps common to all simulations; the arguments after
+    # `diagnostic` are those of the happi diagnostic (e.g. "Probe", 0, "Ex", units=["um"])
+    jobs = [ (path, diagnostic, args, kwargs) for path in paths ]
+    processes = min( processes or len(jobs), len(jobs) )
+    if processes > 1:
+        context = get_context( 'fork' if 'fork' in get_all_start_methods() else None )
+        with context.Pool( processes ) as pool:
+            results = pool.map( _read_, jobs, chunksize=1 )
+    else:
+        results = [ _read_( job ) for job in jobs ]
+
+    timesteps = reduce( np.intersect1d, [ steps for steps, data in results ] )
+    aligned   = [ data[ np.isin(steps, timesteps) ] for steps, data in results ]
+    shapes    = set( a.shape[1:] for a in aligned )
+    if len(shapes) > 1:
+        raise ValueError( "The diagnostic %s has different shapes in the simulations: %s" % (diagnostic, sorted(shapes)) )
+    return timesteps, np.stack( aligned )
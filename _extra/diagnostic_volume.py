@@ -0,0 +1,340 @@
+#
+#  DISK VOLUME OF THE DIAGNOSTICS OF A NAMELIST
+#
+
+# Executes a namelist against stub blocks (Smilei is not needed) and estimates, for each
+# diagnostic, the number of dumps and the bytes per dump, the total disk volume and the
+# write bandwidth. If the total exceeds a budget, the `every` of the largest diagnostics
+# are multiplied until it fits:
+#
+#     python diagnostic_volume.py namelist.py [--budget 50GB] [--iteration-time 0.05]
+#
+# The sizes are estimates of the data written (not of the HDF5 overheads). The number of
+# particles of a species is estimated from its particles_per_cell & number_density on a
+# coarse sample of the grid, at several positions of the moving window (or taken from its
+# position array). For DiagTrackParticles with a filter, for species created by ionization or
+# radiation, or with densities using profiles other than constant & polygonal, this is an
+# upper bound; for species initialized from a file, another species or a position array
+# that the namelist does not build (e.g. in analysis mode), the volume is marked unknown.
+
+import argparse
+import numpy as np
+
+
+# STUB NAMELIST
+# -------------
+
+_SINGLETONS = [ "Main", "LoadBalancing", "MultipleDecomposition", "Vectorization", "MovingWindow",
+                "Checkpoints", "RadiationReaction", "MultiphotonBreitWheeler" ]
+_BLOCKS     = [ "Species", "ParticleInjector", "Laser", "LaserPlanar1D", "LaserGaussian2D", "LaserGaussian3D",
+                "LaserGaussianAM", "LaserOffset", "LaserEnvelope", "LaserEnvelopePlanar1D",
+                "LaserEnvelopeGaussian2D", "LaserEnvelopeGaussian3D", "LaserEnvelopeGaussianAM",
+                "ExternalField", "PrescribedField", "Antenna", "Collisions", "CurrentFilter", "FieldFilter",
+                "DiagScalar", "DiagFields", "DiagProbe", "DiagParticleBinning", "DiagScreen",
+                "DiagRadiationSpectrum", "DiagTrackParticles", "DiagNewParticles", "DiagPerformances" ]
+_PROFILES   = [ "constant", "trapezoidal", "gaussian", "polygonal", "cosine", "polynomial",
+                "tconstant", "ttrapezoidal", "tgaussian", "tpolygonal", "tcosine", "tpolynomial", "tsin2plateau" ]
+
+def _block_( name, singleton ):
+    # Stub block: keeps its arguments as attributes (also on the class for singletons,
+    # so that the namelist can use e.g. Main.grid_length), and records its instances
+    def new( cls, *args, **kwargs ):
+        block = object.__new__( cls )
+        if name == "Main":
+            kwargs = _main_( kwargs )
+        block.__dict__.update( kwargs )
+        if singleton:
+            for k, v in kwargs.items():
+                setattr( cls, k, v )
+        cls.instances.append( block )
+        return block
+    return type( name, (object,), dict(__new__=new, instances=[]) )
+
+def _main_( kwargs ):
+    # Arguments of Main with those Smilei derives from the others (grid_length or
+    # number_of_cells, timestep from timestep_over_CFL)
+    kwargs = dict( kwargs )
+    d = kwargs.get( 'cell_length' )
+    if d is not None and 'grid_length' not in kwargs and 'number_of_cells' in kwargs:
+        kwargs['grid_length'] = [ n*dx for n, dx in zip(kwargs['number_of_cells'], d) ]
+    if d is not None and 'number_of_cells' not in kwargs and 'grid_length' in kwargs:
+        kwargs['number_of_cells'] = [ int(round(L/dx)) for L, dx in zip(kwargs['grid_length'], d) ]
+    if d is not None and 'timestep' not in kwargs and 'timestep_over_CFL' in kwargs:
+        kwargs['timestep'] = kwargs['timestep_over_CFL'] / np.sqrt( sum( 1./dx**2 for dx in d ) )
+    return kwargs
+
+def _profile_( name ):
+    # Stub profile, only telling where it is not zero: exactly for constant & polygonal
+    # profiles, and everywhere for the other ones (which are marked as approximate)
+    def profile( *args, **kwargs ):
+        if name == "constant":
+            vacuum = [ kwargs.get(k+'vacuum', 0.) for k in 'xyz' ]
+            value  = float( args[0] if args else kwargs.get('value', 1.) )
+            f = lambda *x: value * np.all( [ np.asarray(xi) >= v for xi, v in zip(x, vacuum) ], axis=0 )
+        elif name == "polygonal":
+            f = lambda x, *rest: np.interp( x, kwargs['xpoints'], kwargs['xvalues'], left=0., right=0. )
+        else:
+            f = lambda *x: 1.
+            f.approximate = True
+        f.profileName = name
+        return f
+    return profile
+
+def read_namelist_( filename, source=None ):
+    # Namespace of the namelist executed with stub blocks (source: text executed instead of the file)
+    namespace = dict( __name__="__namelist__", __file__=filename,
+                      smilei_mpi_rank=0, smilei_mpi_size=1, smilei_omp_threads=1, smilei_total_cores=1 )
+    for name in _SINGLETONS:
+        namespace[name] = _block_( name, True )
+    for name in _BLOCKS:
+        namespace[name] = _block_( name, False )
+    for name in _PROFILES:
+        namespace[name] = _profile_( name )
+    if source is None:
+        with open( filename ) as file:
+            source = file.read()
+    exec( compile(source, filename, 'exec'), namespace )
+    return namespace
+
+
+# SIZES
+# -----
+
+def _grid_( main ):
+    # Number of cells in each direction
+    return [ int(round(L/d)) for L, d in zip(main.grid_length, main.cell_length) ]
+
+def _number_of_iterations_( main ):
+    if hasattr( main, 'number_of_timesteps' ):
+        return int( main.number_of_timesteps )
+    return int( main.simulation_time / main.timestep )
+
+def _number_of_dumps_( every, n_iterations ):
+    # Number of iterations 0 to n_iterations selected by `every` (a period, or
+    # [period], [start, period], [start, end, period], [start, end, period, repeat, spacing])
+    if every is None or every == 0:
+        return 0
+    if np.isscalar( every ):
+        every = [ every ]
+    every  = list(every) + [None]*(5-len(every))
+    if every[1] is None:
+        start, end, period = 0, n_iterations, every[0]
+    elif every[2] is None:
+        start, end, period = every[0], n_iterations, every[1]
+    else:
+        start, end, period = every[0], min(every[1], n_iterations), every[2]
+    repeat = every[3] or 1
+    if period <= 0 or end < start:
+        return 0
+    return ( int((end-start)//period) + 1 ) * int(repeat)
+
+def _window_shifts_( namespace, n_shifts=16 ):
+    # Positions of the moving window along x at n_shifts times of the simulation ([0.] without window)
+    window = namespace["MovingWindow"]
+    if not window.instances:
+        return [ 0. ]
+    main  = namespace["Main"]
+    times = np.linspace( 0., _number_of_iterations_(main)*main.timestep, n_shifts )
+    return list( getattr(window, 'velocity_x', 1.) * np.maximum( 0., times - getattr(window, 'time_start', 0.) ) )
+
+def _combine_bounds_( *bounds ):
+    # Bound of a sum of estimates, each exact (''), an 'upper bound' or 'unknown'
+    bounds = set( bounds ) - { '' }
+    if len( bounds ) > 1:
+        return 'unknown'
+    return bounds.pop() if bounds else ''
+
+def _species_particles_( species, main, shifts=(0.,), samples=100000 ):
+    # Number of macro-particles of a species (largest over the positions `shifts` of the window),
+    # & whether this is exact (''), an 'upper bound' or 'unknown'
+    position = getattr( species, 'position_initialization', None )
+    if isinstance( position, np.ndarray ):
+        return position.shape[-1], ''
+    ppc     = getattr( species, 'particles_per_cell', 0 )
+    density = getattr( species, 'number_density', getattr(species, 'charge_density', 0.) )
+    grid    = _grid_( main )
+    if ppc == 0:
+        # empty species (e.g. filled by ionization), or particles from a file or from
+        # an array that the namelist does not build (e.g. in analysis mode)
+        return 0, '' if position in ( "regular", "random", "centered" ) else 'unknown'
+    if not callable( density ):
+        return ppc * int(np.prod(grid)), ''
+    # fraction of the cells where the density is not zero, on a coarse sample of the grid
+    # of about `samples` points over all the shifts
+    # (upper bound when the density uses a profile that is not known here)
+    stride   = max( 1, int( (np.prod(grid)*len(shifts)/samples)**(1./len(grid)) ) )
+    axes     = [ (np.arange(0, n, stride)+0.5)*d for n, d in zip(grid, main.cell_length) ]
+    points   = np.meshgrid( *axes, indexing='ij' )
+    fraction = max( _nonzero_( density, [points[0]+shift] + list(points[1:]) ).mean() for shift in shifts )
+    return int( ppc * np.prod(grid) * fraction ), 'upper bound' if _uses_approximate_profile_( density ) else ''
+
+def _nonzero_( density, points ):
+    # Where the density is not zero, called on the arrays of positions when it accepts them
+    # (one position at a time otherwise)
+    try:
+        with np.errstate( all='ignore' ):
+            values = np.asarray( density(*points), dtype=float )
+        if values.shape in ( (), points[0].shape ):
+            return np.broadcast_to( values != 0., points[0].shape )
+    except (TypeError, ValueError):
+        pass
+    return np.vectorize( lambda *x: density(*x) != 0. )( *points )
+
+def _uses_approximate_profile_( f, depth=0 ):
+    # Whether a profile is, or refers to, a stub profile that is not zero everywhere
+    if getattr( f, 'approximate', False ):
+        return True
+    code = getattr( f, '__code__', None )
+    if code is None or depth > 3:
+        return False
+    used = [ f.__globals__.get(name) for name in code.co_names ]
+    used += [ cell.cell_contents for cell in (f.__closure__ or ()) ]
+    return any( callable(g) and _uses_approximate_profile_(g, depth+1) for g in used )
+
+def _fields_( diag, namespace ):
+    # Fields written by a DiagFields block (all fields by default)
+    fields = getattr( diag, 'fields', [] )
+    if not fields:
+        species = namespace["Species"].instances
+        fields  = [ "E", "E", "E", "B", "B", "B", "J", "J", "J", "Rho" ] + [ "J", "J", "J", "Rho" ] * len(species)
+    return fields
+
+def _bytes_per_dump_( kind, diag, namespace, particles ):
+    # Bytes written by one dump of a diagnostic, & whether this is exact (''), an 'upper bound' or 'unknown'
+    main = namespace["Main"]
+    grid = _grid_( main )
+    AM   = main.geometry == "AMcylindrical"
+    size = 4 if getattr( diag, 'datatype', 'double' ) == 'float' else 8
+
+    if kind == "DiagFields":
+        points = np.prod([ n+1 for n in grid ])
+        if AM:
+            # one complex array per field & mode
+            return len(_fields_(diag, namespace)) * getattr(main, 'number_of_AM', 1) * 2*size * points, ''
+        return len(_fields_(diag, namespace)) * size * points, ''
+
+    if kind == "DiagProbe":
+        points = np.prod( getattr(diag, 'number', [1]) )
+        fields = getattr( diag, 'fields', [] ) or range(10)
+        return len(fields) * 8 * points, ''
+
+    if kind in ("DiagParticleBinning", "DiagScreen", "DiagRadiationSpectrum"):
+        bins = [ axis[3] for axis in getattr(diag, 'axes', []) ]
+        if kind == "DiagRadiationSpectrum":
+            bins.append( diag.photon_energy_axis[2] )
+        return 8 * int(np.prod(bins)), ''
+
+    if kind == "DiagTrackParticles":
+        species    = diag.species if isinstance(diag.species, (list, tuple)) else [ diag.species ]
+        attributes = getattr( diag, 'attributes', ["x", "y", "z", "px", "py", "pz", "w"] )
+        counts     = [ particles.get( name, (0, 'unknown') ) for name in species ]
+        n          = sum( n_species for n_species, bound in counts )
+        bound      = _combine_bounds_( *[ bound for n_species, bound in counts ] )
+        if hasattr( diag, 'filter' ):
+            bound = _combine_bounds_( bound, 'upper bound' )
+        # one value per attribute & the particle id
+        return n * 8 * (len(attributes) + 1), bound
+
+    if kind == "DiagScalar":
+        n_scalars = len( getattr(diag, 'vars', []) ) or 20 + 10*len(namespace["Species"].instances)
+        return 16 * n_scalars, ''
+
+    if kind == "DiagPerformances":
+        return 8 * 20 * int(np.prod( getattr(main, 'number_of_patches', [1]) )), ''
+
+    return 0, 'unknown'
+
+
+def diagnostic_volumes_( namespace ):
+    # List of {diagnostic, every, dumps, bytes_per_dump, bytes, bound} for each diagnostic
+    # (bound: '' when the estimate is exact, 'upper bound' or 'unknown')
+    main         = namespace["Main"]
+    n_iterations = _number_of_iterations_( main )
+    shifts       = _window_shifts_( namespace )
+    particles    = { getattr(species, 'name', ''): _species_particles_(species, main, shifts)
+                     for species in namespace["Species"].instances }
+    # electrons created by ionization: at most one per remaining charge of each ion macro-particle
+    for species in namespace["Species"].instances:
+        target = getattr( species, 'ionization_electrons', None )
+        if target in particles:
+            charges = getattr( species, 'maximum_charge_state', getattr(species, 'atomic_number', 0) ) - getattr( species, 'charge', 0 )
+            n, bound = particles[ target ]
+            n_ions, bound_ions = particles[ getattr(species, 'name', '') ]
+            particles[ target ] = ( n + int( n_ions * max(charges, 0) ), _combine_bounds_( bound, bound_ions, 'upper bound' ) )
+    volumes = []
+    for kind in _BLOCKS:
+        if not kind.startswith("Diag"):
+            continue
+        for number, diag in enumerate(namespace[kind].instances):
+            every = getattr( diag, 'every', 1 if kind=="DiagScalar" else 0 )
+            bytes_per_dump, bound = _bytes_per_dump_( kind, diag, namespace, particles )
+            dumps = _number_of_dumps_( every, n_iterations )
+            volumes.append( dict( diagnostic = '%s%d' % (kind[4:], number), every = every, dumps = dumps,
+                                  bytes_per_dump = int(bytes_per_dump), bytes = int(dumps*bytes_per_dump),
+                                  bound = bound ) )
+    return volumes
+
+
+def decimation_( volumes, budget ):
+    # New `every` of the diagnostics that change, so that the total volume is below budget
+    # (the period of the largest diagnostic is doubled until the total fits), & the new total
+    volumes = [ dict(v) for v in volumes ]
+    suggested = {}
+    while sum( v['bytes'] for v in volumes ) > budget:
+        candidates = [ v for v in volumes if v['dumps'] > 1 and np.isscalar( v['every'] ) ]
+        if not candidates:
+            break
+        largest = max( candidates, key=lambda v: v['bytes'] )
+        largest['every'] *= 2
+        largest['dumps']  = -(-largest['dumps'] // 2)
+        largest['bytes']  = largest['dumps'] * largest['bytes_per_dump']
+        suggested[ largest['diagnostic'] ] = largest['every']
+    return suggested, sum( v['bytes'] for v in volumes )
+
+
+def _format_bytes_( n ):
+    for unit in [ 'B', 'kB', 'MB', 'GB', 'TB' ]:
+        if abs(n) < 1000. or unit == 'TB':
+            return '%.3g %s' % (n, unit)
+        n /= 1000.
+
+def _parse_bytes_( text ):
+    units = dict( B=1, KB=1e3, MB=1e6, GB=1e9, TB=1e12 )
+    text  = text.strip().upper()
+    for unit in sorted( units, key=len, reverse=True ):
+        if text.endswith( unit ):
+            return float( text[:-len(unit)] ) * units[unit]
+    return float( text )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description='Estimates the disk volume of the diagnostics of a namelist' )
+    parser.add_argument( 'namelist' )
+    parser.add_argument( '--budget', default=None, help='maximum total volume, e.g. 50GB' )
+    parser.add_argument( '--iteration-time', type=float, default=None, help='wall-clock time of one iteration, in s' )
+    args = parser.parse_args()
+
+    namespace    = read_namelist_( args.namelist )
+    volumes      = diagnostic_volumes_( namespace )
+    n_iterations = _number_of_iterations_( namespace["Main"] )
+    total        = sum( v['bytes'] for v in volumes )
+
+    print( '%-22s %-14s %8s %14s %14s' % ('diagnostic', 'every', 'dumps', 'per dump', 'total') )
+    for v in volumes:
+        print( '%-22s %-14s %8d %14s %14s%s' % ( v['diagnostic'], v['every'], v['dumps'], _format_bytes_(v['bytes_per_dump']),
+               _format_bytes_(v['bytes']), '  (%s)' % v['bound'] if v['bound'] else '' ) )
+    print( '- total volume: '+_format_bytes_(total)+' in '+str(n_iterations)+' iterations, i.e. '
+           +_format_bytes_(total/max(n_iterations, 1))+' per iteration' )
+    if args.iteration_time:
+        print( '- average write bandwidth: '+_format_bytes_(total/max(n_iterations, 1)/args.iteration_time)+'/s' )
+
+    if args.budget:
+        budget    = _parse_bytes_( args.budget )
+        suggested, new_total = decimation_( volumes, budget )
+        if total <= budget:
+            print( '- the total volume is below the budget of '+_format_bytes_(budget) )
+        else:
+            print( '- to stay below '+_format_bytes_(budget)+', use:' )
+            for diagnostic, every in suggested.items():
+                print( '    '+diagnostic+': every = '+str(every) )
+            print( '  the total volume is then '+_format_bytes_(new_total) )
@@ -1,6 +1,6 @@
 import numpy as np
 import cmath
-import scipy.special as sp
+import collections
 
 
 geometry   = "3Dcartesian"  # or "AMcylindrical"
@@ -79,10 +79,43 @@ R                   = (xmin-focus[0]) * (1. + (x_R/(xmin-focus[0]))**2)  # radiu
 w                   = waist * np.sqrt(1. + ( (xmin - focus[0]) /x_R)**2) # waist at xmin
 Gouy_phase          = np.exp(-1j   * (2*p+abs(l)+1) * np.arctan2( (xmin-focus[0]),x_R) )  
 
+# Smilei evaluates the laser profiles at each timestep on the same positions (the boundary
+# points at xmin, one by one as floats or by arrays). The transverse parts of the envelope do
+# not depend on time: cached_transverse computes them once for each position, or array of
+# positions, so that each timestep only applies the temporal factor. The floats are kept up
+# to max_points (a 3D boundary has a few thousand points), and the max_cached least recently
+# used arrays.
+def positions_key(*coordinates):
+    if all( isinstance(c, float) for c in coordinates ):
+        return coordinates
+    return tuple( (np.shape(c), np.asarray(c, dtype=float).tobytes()) for c in coordinates )
+
+def cached_transverse(envelope, max_cached=4096, max_points=2**20):
+    points = {}                        # floats -> transverse part (complex)
+    arrays = collections.OrderedDict() # positions -> transverse part (array), least recently used first
+    def cached(*coordinates):
+        if all( isinstance(c, float) for c in coordinates ):
+            if coordinates not in points:
+                if len(points) >= max_points: points.clear()
+                points[coordinates] = complex(envelope(*coordinates))
+            return points[coordinates]
+        key = positions_key(*coordinates)
+        if key in arrays:
+            arrays.move_to_end(key)
+        else:
+            if len(arrays) >= max_cached: arrays.popitem(last=False)
+            arrays[key] = envelope(*coordinates)
+        return arrays[key]
+    return cached
+
+@cached_transverse
 def LG_radial_part(r):
     # this function defines the part of the complex envelope of the 
     # Laguerre Gauss mode p=0, l=1 
     # that depends only on r
+    # (scipy.special is imported when the profile is first used, i.e. not when
+    # the namelist is only read to analyse the results)
+    import scipy.special as sp
     result = waist / w * sp.eval_genlaguerre(p, abs(l), (2 * np.square(r) / w**2)) 
     result = result * np.power( (np.sqrt(2) * r / w), abs(l) )
     result = result * np.exp(-np.square(r) / w**2)
@@ -100,23 +133,27 @@ if (geometry  == "3Dcartesian"):
     def By(y,z,t):
         return 0.
 
-    def Bz(y,z,t):
+    @cached_transverse
+    def LG_transverse_part(y,z):
         r     = np.sqrt(np.square(y-focus[1])+np.square(z-focus[1]))
         theta = np.arctan2((z-focus[1]),(y-focus[1]))
-        return a0*np.real(LG_radial_part(r)*np.exp(1j*l*theta)*np.exp(-1j*omega*t)*time_envelope(t))
+        return a0*LG_radial_part(r)*np.exp(1j*l*theta)
+    # temporal factor exp(-i omega t)*time_envelope(t), computed once for each time t
+    temporal = [None, 0j]
+    def Bz(y,z,t):
+        if t != temporal[0]:
+            temporal[:] = [t, cmath.exp(-1j*omega*t)*time_envelope(t)]
+        return (LG_transverse_part(y,z)*temporal[1]).real
 
     # Define the laser pulse
     Laser( box_side = "xmin",space_time_profile = [By, Bz])
 
-    # Define Plasma density profile
+    # Define Plasma density profile (accepts arrays of positions)
     def my_profile(x,y,z):
         center_plasma = [Lx/4.,Ltrans/2.,Ltrans/2.]
         Radius = 20. 
         Length = 5.
-        if ((abs(x-center_plasma[0])<Length) and ((y-center_plasma[1])**2+(z-center_plasma[2])**2<Radius*Radius)):
-              return 1.
-        else:
-            return 0.
+        return np.where((abs(x-center_plasma[0])<Length) & ((y-center_plasma[1])**2+(z-center_plasma[2])**2<Radius*Radius), 1., 0.)
  
 if (geometry  == "AMcylindrical"):
 
@@ -129,31 +166,42 @@ if (geometry  == "AMcylindrical"):
 
     def Bz_radial_part(r,t):
         return a0*LG_radial_part(r)*np.exp(-1j*omega*t)*time_envelope(t)
-    def Br_mode0(r,t):
-        return -1j/2.*np.conjugate(Bz_radial_part(r,t))
-    def Bt_mode0(r,t):
-        return  1./2.*np.conjugate(Bz_radial_part(r,t))
-    def Br_mode1(r,t):
-        return 0j
-    def Bt_mode1(r,t):
-        return 0j
-    def Br_mode2(r,t):
-        return 1j/2.*np.conjugate(Bz_radial_part(r,t))
-    def Bt_mode2(r,t):
-        return 1./2.*np.conjugate(Bz_radial_part(r,t))
+
+    # The functions of space_time_profile_AM are all derived from the complex function source(r,t):
+    # profiles_AM_from_source evaluates it once for each array of positions r at the time t, and
+    # each component (a function of this value, or None for 0) reuses it. Only the values of the
+    # current time are kept (at most max_cached arrays).
+    def profiles_AM_from_source(source, components, max_cached=4096):
+        current = {"t": None, "values": {}}
+        def profile(component):
+            def f(r,t):
+                if component is None:
+                    return 0j
+                if t != current["t"] or len(current["values"]) >= max_cached:
+                    current["t"], current["values"] = t, {}
+                key = positions_key(r)
+                if key not in current["values"]:
+                    current["values"][key] = source(r,t)
+                return component(current["values"][key])
+            return f
+        return [profile(component) for component in components]
+
+    Br_mode0, Bt_mode0, Br_mode1, Bt_mode1, Br_mode2, Bt_mode2 = profiles_AM_from_source(
+        lambda r,t: np.conjugate(Bz_radial_part(r,t)),
+        [ lambda B: -1j/2.*B, lambda B: 1./2.*B,  # mode 0
+          None,               None,               # mode 1
+          lambda B:  1j/2.*B, lambda B: 1./2.*B ] # mode 2
+    )
 
     # Define the laser pulse
     Laser( box_side = "xmin",space_time_profile_AM = [Br_mode0, Bt_mode0, Br_mode1, Bt_mode1, Br_mode2, Bt_mode2])
 
-    # Define Plasma density profile
+    # Define Plasma density profile (accepts arrays of positions)
     def my_profile(x,r):
         center_plasma = Lx/4.
         Radius = 20. 
         Length = 5.
-        if ((abs(x-center_plasma)<Length) and (r<Radius)):
-            return 1.
-        else:
-            return 0.
+        return np.where((abs(x-center_plasma)<Length) & (r<Radius), 1., 0.)
 
 # Add some test electrons
 Species( 
@@ -87,14 +87,14 @@ x_plateau                   = x_density_transition_peak+shock_downramp_length
 x_end_plateau               = x_plateau                +plateau_length
 x_end_plasma                = x_end_plateau            +downramp_length
 
-longitudinal_profile        = polygonal(xpoints=[x_start_plasma,x_density_transition_peak,x_plateau,x_end_plateau,x_end_plasma], 
-                                        xvalues=[0.,2.*density_plateau_normalized,density_plateau_normalized,density_plateau_normalized,0.])
+longitudinal_xpoints        = [x_start_plasma,x_density_transition_peak,x_plateau,x_end_plateau,x_end_plasma]
+longitudinal_xvalues        = [0.,2.*density_plateau_normalized,density_plateau_normalized,density_plateau_normalized,0.]
+longitudinal_profile        = polygonal(xpoints=longitudinal_xpoints, xvalues=longitudinal_xvalues)
                                                                                 
+# written with numpy functions, so that Smilei can evaluate it on the arrays of positions of a whole patch
 def nplasma(x,r):
-    profile_r = 0.
-    if (r<Radius_plasma):
-        profile_r = 1.
-    return profile_r*longitudinal_profile(x,r)
+    profile_r = np.where(r<Radius_plasma, 1., 0.)
+    return profile_r*np.interp(x, longitudinal_xpoints, longitudinal_xvalues, left=0., right=0.)
 
 if (use_BTIS3_interpolation == False):
     pusher = "boris"
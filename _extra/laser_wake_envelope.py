@@ -174,17 +174,14 @@ def dens_func_e(x, r):
     return (Prop_H_in_1 + Prop_N_in_1*Q_init_N)*n1 + n2
 
 # number density profile of the dopant (nitrogen)
+# written with numpy functions, so that Smilei can evaluate it on the arrays of positions of a whole patch
 def my_density_profile_dopant(x,r):
-    radial_profile     = 1.
-    if (r>R_plasma) or (x<p_xmin/c_over_omega0):
-        radial_profile = 0.
+    radial_profile     = np.where((r>R_plasma) | (x<p_xmin/c_over_omega0), 0., 1.)
     return radial_profile*dens_func_at1(x,r)*Prop_N_in_1*n_at
 
 # number density profile of the electrons (hydrogen + first 5 levels of nitrogen)
 def density_profile_electrons(x,r):
-    radial_profile     = 1.
-    if (r>R_plasma) or (x<p_xmin/c_over_omega0):
-        radial_profile = 0.
+    radial_profile     = np.where((r>R_plasma) | (x<p_xmin/c_over_omega0), 0., 1.)
     return radial_profile*dens_func_e(x,r)*n_at
 
 ###### define the plasma electrons
@@ -0,0 +1,94 @@
+########################################################################
+### STREAMING READER FOR PARTICLEBINNING DIAGNOSTICS WRITTEN OFTEN   ###
+########################################################################
+
+# Smilei writes the ParticleBinning diagnostic number `diag` in the file
+# ParticleBinning<diag>.h5 of the results directory, as one dataset "timestepXXXXXXXX"
+# per output. Instead of building the list of all outputs (as getData() in happi),
+# the outputs of a time window are read directly in a preallocated array, or
+# streamed through a buffer of chunk_size outputs, so that the memory used and
+# the reading time scale with the window.
+
+import os
+import h5py
+from numpy import array, empty
+
+
+def _binning_outputs_( results_path, diag ):
+    # Sorted timesteps of the outputs, and the file holding each of them; results_path
+    # may be a list of directories (restarts), the last one having priority
+    if isinstance(results_path, str):
+        results_path = [ results_path ]
+    files = {}
+    for path in results_path:
+        filename = os.path.join( path, 'ParticleBinning%d.h5' % diag )
+        with h5py.File( filename, 'r' ) as f:
+            for name in f:
+                if name.startswith('timestep'):
+                    files[ int(name[8:]) ] = filename
+    timesteps = array( sorted(files), dtype=int )
+    return timesteps, [ files[timestep] for timestep in timesteps ]
+
+
+def _select_( timesteps, window ):
+    # Mask of the timesteps between window[0] and window[1] (included)
+    if window is None:
+        return timesteps == timesteps
+    return (timesteps >= window[0]) & (timesteps <= window[1])
+
+
+class _Reader( object ):
+    # Reads outputs in arrays, keeping the last opened file open
+    def __init__( self, results_path, diag ):
+        self.timesteps, self.filenames = _binning_outputs_( results_path, diag )
+        self.file = None
+
+    def dataset( self, index ):
+        if self.file is None or self.file.filename != self.filenames[index]:
+            self.close()
+            self.file = h5py.File( self.filenames[index], 'r' )
+        return self.file[ 'timestep%08d' % self.timesteps[index] ]
+
+    def read( self, indices, out ):
+        for i, index in enumerate(indices):
+            self.dataset( index ).read_direct( out[i] )
+
+    def close( self ):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def iter_particle_binning_( results_path, diag=0, timesteps=None, chunk_size=256 ):
+    # Yields (timesteps, data) for successive chunks of at most chunk_size outputs between
+    # the timesteps timesteps[0] & timesteps[1] (all outputs by default), data having
+    # the shape (n_times, *bins). The same buffer is reused for all chunks.
+    reader   = _Reader( results_path, diag )
+    selected = _select_( reader.timesteps, timesteps ).nonzero()[0]
+    try:
+        if len(selected) > 0:
+            first  = reader.dataset( selected[0] )
+            buffer = empty( (min(chunk_size, len(selected)),)+first.shape, dtype=first.dtype )
+        for start in range(0, len(selected), chunk_size):
+            chunk = selected[start:start+chunk_size]
+            reader.read( chunk, buffer )
+            yield reader.timesteps[chunk], buffer[:len(chunk)]
+    finally:
+        reader.close()
+
+
+def read_particle_binning_( results_path, diag=0, timesteps=None ):
+    # (timesteps, data) of all outputs between the timesteps timesteps[0] & timesteps[1]
+    # (all outputs by default), data being an array of shape (n_times, *bins)
+    # allocated once, in which the outputs are read directly
+    reader   = _Reader( results_path, diag )
+    selected = _select_( reader.timesteps, timesteps ).nonzero()[0]
+    try:
+        if len(selected) == 0:
+            return reader.timesteps[selected], empty((0,))
+        first = reader.dataset( selected[0] )
+        data  = empty( (len(selected),)+first.shape, dtype=first.dtype )
+        reader.read( selected, data )
+    finally:
+        reader.close()
+    return reader.timesteps[selected], data
@@ -0,0 +1,86 @@
+####################################################################
+### LAB-FRAME RECONSTRUCTION OF PROBES RECORDED IN A MOVING WINDOW ###
+####################################################################
+
+# A Probe whose first axis is along x moves with the MovingWindow of the simulation.
+# stitch_probe_ places each of its outputs on a global lab-frame x grid, at the
+# position of the window at the time of the output (computed from the time_start &
+# velocity_x of the MovingWindow, the window moving by whole cells as in Smilei):
+#
+#     times, x, data = stitch_probe_( "/path/to/simulation", probe=1, field="-Rho", filename="rho_lab.npy" )
+#
+# data[i, j, ...] is the field at the time times[i] & at the lab-frame position x[j]
+# (linearly interpolated along x between the probe points, NaN outside the window).
+# It is a .npy file written one output at a time and memory-mapped, so that only
+# one output of the probe is in memory, whatever the length of the plasma.
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from analysis_mode import open_simulation_
+
+
+def window_shift_( namelist, time ):
+    # Distance travelled by the moving window at the time `time` (a multiple of the cell length)
+    window = namelist.MovingWindow
+    if len( window ) == 0:
+        return 0.
+    dx = namelist.Main.cell_length[0]
+    return dx * np.floor( max( 0., time - window.time_start ) * window.velocity_x / dx + 1e-9 )
+
+
+def _probe_x_axis_( namelist, probe ):
+    # Positions of the points of a probe along its first axis (that must be along x) in the window
+    block   = namelist.DiagProbe[ probe ]
+    origin  = np.array( block.origin, dtype=float )
+    axis    = np.array( block.corners[0], dtype=float ) - origin
+    if np.any( axis[1:] != 0. ):
+        raise ValueError( "The first axis of Probe%d is not along x" % probe )
+    number  = block.number[0]
+    return origin[0] + axis[0] * np.arange( number ) / max( number-1, 1 )
+
+
+def _interpolate_on_lab_grid_( data, x_window, x_lab ):
+    # data (along x_window, on its first axis) linearly interpolated at the lab-frame positions
+    # x_lab, all inside the window
+    position = ( x_lab - x_window[0] ) / ( x_window[1] - x_window[0] )
+    i        = np.clip( np.floor( position ).astype(int), 0, len(x_window)-2 )
+    w        = ( position - i ).reshape( (-1,) + (1,)*(data.ndim-1) )
+    return (1.-w) * data[i] + w * data[i+1]
+
+
+def stitch_probe_( results_path, probe=0, field="Ex", filename="probe_lab_frame.npy",
+                   timesteps=None, simulation=None, **probe_options ):
+    # (times, x, data) of the field of a probe in the lab frame, data being memory-mapped from
+    # `filename`; timesteps selects the outputs as in happi (all outputs by default), and the
+    # other keywords are passed to happi's Probe (units are not supported)
+    S        = simulation or open_simulation_( results_path, verbose=False )
+    namelist = S.namelist
+    diag     = S.Probe( probe, field, **probe_options )
+    steps    = np.array( diag.getTimesteps() )
+    if timesteps is not None:
+        steps = steps[ (steps >= timesteps[0]) & (steps <= timesteps[-1]) ]
+    if len(steps) == 0:
+        raise ValueError( "No output of Probe%d in the selected timesteps" % probe )
+    times    = steps * namelist.Main.timestep
+    shifts   = np.array([ window_shift_( namelist, t ) for t in times ])
+
+    # lab-frame grid with the spacing of the probe, from the first to the last window position
+    x_window = _probe_x_axis_( namelist, probe )
+    dx       = x_window[1] - x_window[0]
+    first    = int( np.ceil( (x_window[0] + shifts.min()) / dx - 1e-9 ) )
+    last     = int( np.floor( (x_window[-1] + shifts.max()) / dx + 1e-9 ) )
+    x        = np.arange( first, last+1 ) * dx
+
+    # each output is read, interpolated on the part of the lab grid covered by the window, and written
+    shape = None
+    for i, (step, shift) in enumerate( zip(steps, shifts) ):
+        output = np.asarray( diag.getData( timestep=step )[0] )
+        if shape is None:
+            shape = output.shape[1:]
+            data  = open_memmap( filename, mode='w+', dtype=output.dtype, shape=(len(steps), len(x))+shape )
+        covered = (x >= x_window[0] + shift - 1e-9*dx) & (x <= x_window[-1] + shift + 1e-9*dx)
+        data[i] = np.nan
+        data[i, covered] = _interpolate_on_lab_grid_( output, x_window + shift, x[covered] )
+        data.flush()
+    del data
+    return times, x, np.load( filename, mmap_mode='r' )
@@ -3,6 +3,7 @@
 # ----------------------------------------------------------------------------------------
 
 import math
+import numpy as np
 
 l0 = 2.0*math.pi       # laser wavelength
 t0 = l0                # optical cycle
@@ -55,16 +56,46 @@ amplitude = a0 / math.sqrt(2)
 w  = math.sqrt(1./(1.+(focus[0]/Zr)**2))
 invWaist2 = (w/waist)**2
 coeff = -omega * focus[0] * w**2 / (2.*Zr**2)
-def By(y,t):
-    B = amplitude * w * math.exp( -invWaist2*(y-focus[1])**2 ) \
-        * math.sin(omega*t - coeff*(y-focus[1])**2 + math.pi*0.5)
-    if t < t0: return t/t0 * B
-    else     : return B
-def Bz(y,t):
-    B = amplitude * w * math.exp( -invWaist2*(y-focus[1])**2 ) \
-        * math.sin(omega*t - coeff*(y-focus[1])**2)
-    if t < t0: return t/t0 * B
-    else     : return B
+
+# Profile time_factor(t) * amplitude(y) * sin(omega*t + phase(y)) for space_time_profile,
+# sin(omega*t+phase) being expanded as sin(omega*t)*cos(phase) + cos(omega*t)*sin(phase):
+# the transverse parts amplitude*cos(phase) & amplitude*sin(phase) are computed once for
+# each position y (a float, when Smilei calls the profile point by point on the boundary)
+# or array of positions, and the time parts once for each time t.
+def separable_profile(amplitude, phase, time_factor, max_cached=4096, max_points=2**20):
+    points = {}      # y -> transverse parts (floats)
+    arrays = {}      # positions -> transverse parts (arrays)
+    temporal = [None, 0., 0.]   # t, time_factor(t)*sin(omega*t), time_factor(t)*cos(omega*t)
+    def profile(y,t):
+        if t != temporal[0]:
+            f = time_factor(t)
+            temporal[:] = [t, f*math.sin(omega*t), f*math.cos(omega*t)]
+        if isinstance(y, float):
+            if y not in points:
+                if len(points) >= max_points: points.clear()
+                A, phi = float(amplitude(y)), float(phase(y))
+                points[y] = (A*math.cos(phi), A*math.sin(phi))
+            C, S = points[y]
+            return temporal[1]*C + temporal[2]*S
+        key = (np.shape(y), np.asarray(y, dtype=float).tobytes())
+        if key not in arrays:
+            if len(arrays) >= max_cached: arrays.clear()
+            A, phi = amplitude(np.asarray(y, dtype=float)), phase(np.asarray(y, dtype=float))
+            arrays[key] = (A*np.cos(phi), A*np.sin(phi))
+        C, S = arrays[key]
+        B = temporal[1]*C + temporal[2]*S
+        return float(B) if np.ndim(B) == 0 else B
+    return profile
+
+def gaussian_amplitude(y):
+    return amplitude * w * np.exp( -invWaist2*(y-focus[1])**2 )
+def curvature_phase(y):
+    return - coeff*(y-focus[1])**2
+def ramp(t):
+    return min(t/t0, 1.)
+
+By = separable_profile(gaussian_amplitude, lambda y: curvature_phase(y) + math.pi*0.5, ramp)
+Bz = separable_profile(gaussian_amplitude, curvature_phase, ramp)
 
 Laser(
     box_side           = "xmin",
@@ -0,0 +1,153 @@
+#########################################################################
+### RATE EQUATIONS FOR MANY NAMELISTS: PROCESS POOL & ON-DISK CACHE  ###
+#########################################################################
+
+# run_rate_eqs_ solves the rate equations of solve_rate_eqs.py for a list of namelists.
+# Each case is identified by a hash of the namelist parameters read by the solver
+# (Main timestep, duration & reference frequency, Laser[0] & Species[0] blocks), of the
+# solver options and of the solver source & atomic data (solve_rate_eqs.py, atomic_data.py &
+# atomic_data.npy). Results are saved in cache_dir, and the least recently used ones are
+# deleted when the files exceed max_cache_size bytes.
+# The cases that are not in the cache are distributed over a pool of processes: the
+# namelists are handed to the workers when they are forked (they are usually not
+# picklable), so that on platforms that cannot fork processes only processes=1 is possible.
+
+import os, io, hashlib, contextlib
+from multiprocessing import get_context, get_all_start_methods
+from numpy import ndarray, savez, load
+from solve_rate_eqs import solve_rate_eqs_, solver_hash_, _CACHE_DIR
+
+_SOLVER_HASH = solver_hash_()
+
+
+def _value_key_( value, depth=0 ):
+    # Hashable description of a namelist value (numbers, lists, arrays or functions)
+    if isinstance(value, (list, tuple)):
+        return tuple( _value_key_(v, depth) for v in value )
+    if isinstance(value, ndarray):
+        return ( 'array', value.dtype.str, value.shape, value.tobytes() )
+    if callable(value) and not isinstance(value, type) and depth < 4:
+        return _callable_key_( value, depth+1 )
+    return repr(value)
+
+
+def _code_key_( code ):
+    # Byte-code & constants of a function (nested functions included)
+    consts = tuple( _code_key_(c) if hasattr(c, 'co_code') else repr(c) for c in code.co_consts )
+    return ( code.co_code, consts, code.co_names )
+
+
+def _callable_key_( f, depth=1 ):
+    # Smilei profiles hold their parameters as attributes (profileName, fwhm, ...);
+    # other functions are described by their code & by the values they capture
+    if hasattr(f, 'profileName'):
+        return tuple(sorted( (k, _value_key_(v, depth)) for k, v in vars(f).items() ))
+    code = getattr(f, '__code__', None)
+    if code is None:
+        return repr(f)
+    closure = [ _value_key_(cell.cell_contents, depth) for cell in (f.__closure__ or ()) ]
+    captured = [ (name, _value_key_(f.__globals__[name], depth)) for name in code.co_names
+                if name in f.__globals__ and not hasattr(f.__globals__[name], '__file__') ]
+    return ( _code_key_(code), _value_key_(f.__defaults__, depth), closure, captured )
+
+
+def rate_eqs_key_( namelist, **solver_options ):
+    # Hash of everything that determines the result of solve_rate_eqs_(namelist, **solver_options)
+    main, laser, species = namelist.Main, namelist.Laser[0], namelist.Species[0]
+    params = (
+        ( main.reference_angular_frequency_SI, main.timestep, main.simulation_time ),
+        ( laser.space_envelope, laser.delay_phase, laser.omega, laser.time_envelope ),
+        ( species.atomic_number, getattr(species, 'charge', 0.), getattr(species, 'maximum_charge_state', 0) ),
+        sorted( solver_options.items() ),
+    )
+    key = hashlib.sha1( repr(_value_key_(params)).encode() )
+    key.update( _SOLVER_HASH.encode() )
+    return key.hexdigest()
+
+
+def _cache_path_( cache_dir, key ):
+    return os.path.join( cache_dir, 'rate_eqs_%s.npz' % key[:24] )
+
+
+def _read_cached_( path ):
+    # Cached (t, n, Env), or None; reading a result marks it as recently used
+    try:
+        with load( path ) as data:
+            result = ( data['t'], data['n'], data['Env'] )
+    except (OSError, KeyError, ValueError):
+        return None
+    os.utime( path )
+    return result
+
+
+def _write_cached_( path, result ):
+    # written to a temporary file first, so that concurrent runs never read a partial result
+    os.makedirs( os.path.dirname(path), exist_ok=True )
+    tmp = path + '.%d.tmp' % os.getpid()
+    with open( tmp, 'wb' ) as file:
+        savez( file, t=result[0], n=result[1], Env=result[2] )
+    os.replace( tmp, path )
+
+
+def _evict_( cache_dir, max_cache_size ):
+    # Deletes the least recently used results until they hold at most max_cache_size bytes
+    files = []
+    for name in os.listdir( cache_dir ):
+        if name.startswith('rate_eqs_') and name.endswith('.npz'):
+            stat = os.stat( os.path.join(cache_dir, name) )
+            files.append( (stat.st_mtime, stat.st_size, name) )
+    total = sum( size for mtime, size, name in files )
+    for mtime, size, name in sorted( files ):
+        if total <= max_cache_size:
+            break
+        try:
+            os.remove( os.path.join(cache_dir, name) )
+        except OSError:
+            pass
+        total -= size
+
+
+_cases = None
+
+def _init_worker_( cases ):
+    global _cases
+    _cases = cases
+
+def _solve_case_( i ):
+    namelist, solver_options = _cases[i]
+    with contextlib.redirect_stdout( io.StringIO() ):
+        return solve_rate_eqs_( namelist, **solver_options )
+
+
+def run_rate_eqs_( namelists, processes=None, cache_dir=None, max_cache_size=2**30, **solver_options ):
+    # (t, n, Env) of solve_rate_eqs_(namelist, **solver_options) for each of the namelists,
+    # read from the cache or computed by a pool of `processes` processes (one per CPU by default)
+    cache_dir = cache_dir or _CACHE_DIR
+    keys      = [ rate_eqs_key_(namelist, **solver_options) for namelist in namelists ]
+
+    results = {}
+    missing = {}
+    for key, namelist in zip(keys, namelists):
+        if key in results or key in missing:
+            continue
+        result = _read_cached_( _cache_path_(cache_dir, key) )
+        if result is None:
+            missing[key] = namelist
+        else:
+            results[key] = result
+
+    if missing:
+        cases = [ (namelist, solver_options) for namelist in missing.values() ]
+        if processes == 1 or len(cases) == 1:
+            _init_worker_( cases )
+            solved = list(map( _solve_case_, range(len(cases)) ))
+        else:
+            context = get_context( 'fork' if 'fork' in get_all_start_methods() else None )
+            with context.Pool( processes, _init_worker_, (cases,) ) as pool:
+                solved = pool.map( _solve_case_, range(len(cases)) )
+        for key, result in zip(missing, solved):
+            results[key] = result
+            _write_cached_( _cache_path_(cache_dir, key), result )
+        _evict_( cache_dir, max_cache_size )
+
+    return [ results[key] for key in keys ]
@@ -1,22 +1,657 @@
-##################################################################
-### SOLVING SIMPLE RATE EQUATIONS FOR THE IONIZATION OF CARBON ###
-##################################################################
+#############################################################
+### SOLVING SIMPLE RATE EQUATIONS FOR THE FIELD IONIZATION ###
+#############################################################
 
-from numpy import array, arange, zeros, pi, exp, sqrt, sin, vectorize
+from numpy import array, arange, zeros, ones, pi, exp, sqrt, sin, cos, vectorize, errstate, where
+from numpy import atleast_1d, broadcast_arrays, ceil, floor, concatenate, diff, cumsum
+from numpy import flatnonzero, add, log, log2, maximum, minimum, save, load
+from numpy import select, searchsorted, allclose, linspace
+from numpy.linalg import matrix_power
 from math import gamma as math_gamma
+import os, hashlib
+from atomic_data import ionization_data
 math_gamma = vectorize(math_gamma)
 
-def solve_rate_eqs_( namelist ):
+
+def solver_hash_():
+    # Hash of the sources of the solver & of the atomic data (solve_rate_eqs.py, atomic_data.py
+    # & atomic_data.npy), to identify the cached solutions (see rate_eqs_runner.py)
+    directory = os.path.dirname( os.path.abspath(__file__) )
+    key = hashlib.sha1()
+    for filename in ( 'solve_rate_eqs.py', 'atomic_data.py', 'atomic_data.npy' ):
+        with open( os.path.join(directory, filename), 'rb' ) as file:
+            key.update( file.read() )
+    return key.hexdigest()
+
+
+def _charge_states_( species ):
+    # Atomic number, initial charge & maximum charge state of an ionizing Species block
+    Zat  = int(species.atomic_number)
+    Z0   = int(round( getattr(species, 'charge', 0.) ))
+    Zmax = int(getattr(species, 'maximum_charge_state', 0)) or Zat
+    if not 0 <= Z0 < Zmax <= Zat:
+        raise ValueError('no ionization possible from charge '+str(Z0)+' with maximum charge state '+str(Zmax))
+    return Zat, Z0, Zmax
+
+
+def _adk_coefficients_( Zat, w_ref, Z0=0, Zmax=None ):
+    # ADK coefficients (in code units) for the successive ionizations of the element
+    # of atomic number Zat, from charge Z0 up to charge Zmax (Zat by default)
+    if Zmax is None:
+        Zmax = Zat
+
+    # conversion factor (between code units & atomic units)
+    au_to_w0 = 4.134137172e+16 / w_ref
+
+    # Atom properties
+    Ip, l = ionization_data( Zat )
+    Z   = arange(Z0, Zmax)
+    Ip  = Ip[Z0:Zmax]/27.2114
+    l   = l[Z0:Zmax]
+
+    nstar = (Z+1.) * sqrt(1./2./Ip)
+    cst   = 2. * nstar
+    alpha = cst - 1.
+    beta  = 2.**(cst-1.)/cst/math_gamma(cst) * (8.*l+4.) * Ip * au_to_w0
+    gamma = 2.*(2.*Ip)**1.5
+
+    return cst, alpha, beta, gamma
+
+
+def _print_summary_( Wadk, Wint, n, w_ref, Z0=0 ):
+
+    # Compare ionisation rates
+    for Z in range(len(Wadk)):
+        print('- [theory] Z ='+str(Z0+Z)+'->'+str(Z0+Z+1)
+              +'    Wadk='+str(Wadk[Z]* w_ref)
+              +'    W   ='+str(Wint[Z] * w_ref)
+        )
+
+    nsum = sum( n[:,-1] )
+    print(' ')
+    print('- [theory] test cons. part. nb:'+str(nsum))
+    print('********** ')
+
+
+def _linear_scan_( a, f, y0 ):
+    # Solves y[...,i] = a[...,i]*y[...,i-1] + f[...,i] (with y[...,-1] = y0) for all i
+    # at once, by composing the affine maps (a,f) with a log2(len)-step doubling scan
+    A = array(a, dtype=float)
+    F = array(f, dtype=float)
+    F[...,0] += A[...,0]*y0
+    d = 1
+    while d < A.shape[-1]:
+        F[...,d:] = A[...,d:]*F[...,:-d] + F[...,d:]
+        A[...,d:] = A[...,d:]*A[...,:-d]
+        d *= 2
+    return F
+
+
+def _adk_rates_( Eau, alpha, beta, gamma ):
+    # ADK rates for all charge states, shape (..., Zat, nt), from the field
+    # modulus Eau (in atomic units) of shape (..., nt) and the coefficients
+    # of shape (..., Zat); delta**alpha * exp(-delta/3) is computed as a single
+    # exponential so that weak fields give vanishing rates instead of inf*0
+    with errstate(divide='ignore', invalid='ignore'):
+        delta = gamma[...,:,None] / Eau[...,None,:]
+        W     = beta[...,:,None] * exp( alpha[...,:,None]*log(delta) - delta/3. )
+    return where( delta < float('inf'), W, 0. )
+
+
+# ADK rate tables: ln(W) is tabulated as a function of x = ln(Eau) on the regular grid
+# x_k = _TABLE_XMIN + k*_TABLE_DX (fields from 1e-4 to 1e5 a.u.), and interpolated with
+# cubic Hermite polynomials using the exact derivatives. As d^4 ln(W)/dx^4 = -delta/3,
+# the relative error on W is below _TABLE_DX**4/384 * delta/3 ~ 1.4e-10*delta, i.e.
+# below 5.e-7 for all rates larger than exp(-1000)*beta (delta < 3000), and in practice
+# for all rates that are normal floating-point numbers. Fields above 1e5 a.u. use the
+# last tabulated value.
+_TABLE_XMIN = log(1.e-4)
+_TABLE_DX   = 0.02
+_TABLE_NX   = int(round( (log(1.e5)-_TABLE_XMIN)/_TABLE_DX )) + 1
+_CACHE_DIR  = os.path.join( os.path.expanduser("~"), ".cache", "smilei_tutorials" )
+
+
+def adk_rate_table_( Zat, w_ref, Z0=0, Zmax=None, cache_dir=None ):
+    # Table of the ADK rates (see above) for the element of atomic number Zat (charge
+    # states Z0 to Zmax) and the reference angular frequency w_ref: the coefficients of the Hermite polynomial
+    # of ln(W) in each interval, of shape (4, _TABLE_NX-1, Zmax-Z0). It is computed once,
+    # saved in cache_dir, and memory-mapped by later calls.
+    cst, alpha, beta, gamma = _adk_coefficients_( Zat, w_ref, Z0, Zmax )
+
+    # the file name depends on the ADK coefficients & on the grid
+    key  = hashlib.sha1( concatenate([ alpha, beta, gamma, [_TABLE_XMIN, _TABLE_DX, _TABLE_NX] ]).tobytes() )
+    path = os.path.join( cache_dir or _CACHE_DIR, 'adk_table_Z%d_%s.npy' % (Zat, key.hexdigest()[:16]) )
+    if os.path.exists( path ):
+        return load( path, mmap_mode='r' )
+
+    # ln(W) and its derivative (times the grid step) at the nodes
+    x     = _TABLE_XMIN + arange(_TABLE_NX)*_TABLE_DX
+    delta = gamma[None,:] * exp(-x[:,None])
+    f     = log(beta) + alpha*log(delta) - delta/3.
+    d     = ( -alpha + delta/3. ) * _TABLE_DX
+
+    # polynomial coefficients in s = (x-x_k)/_TABLE_DX for each interval [x_k, x_k+1]
+    table = array([ f[:-1],
+                    d[:-1],
+                    3.*(f[1:]-f[:-1]) - 2.*d[:-1] - d[1:],
+                    2.*(f[:-1]-f[1:]) + d[:-1] + d[1:] ])
+
+    # written to a temporary file first, so that concurrent calls never read a partial table
+    os.makedirs( os.path.dirname(path), exist_ok=True )
+    tmp = path + '.%d.tmp' % os.getpid()
+    with open( tmp, 'wb' ) as file:
+        save( file, table )
+    os.replace( tmp, path )
+    return load( path, mmap_mode='r' )
+
+
+def _tabulated_rates_( Eau, table ):
+    # Same as _adk_rates_, interpolated in a table built by adk_rate_table_:
+    # the interval & position are computed once for all charge states
+    with errstate(divide='ignore', invalid='ignore'):
+        x = minimum( ( log(Eau) - _TABLE_XMIN ) / _TABLE_DX, _TABLE_NX-1 )
+    j = minimum( maximum( x, 0. ).astype(int), _TABLE_NX-2 )
+    s = (x - j)[...,None]
+    with errstate(invalid='ignore', over='ignore'):
+        lnW = table[3].take(j, axis=0)
+        for k in (2,1,0):
+            lnW *= s
+            lnW += table[k].take(j, axis=0)  # (..., nt, Zat)
+        W   = where( s >= 0., exp(lnW), 0. )  # fields below the table give vanishing rates
+    return W.swapaxes(-1,-2)
+
+
+def _integrate_cn_( W, dt, n0=None ):
+    # Crank-Nicolson solution of the rate equations starting from the populations n0
+    # (neutral atoms by default), for the rates W of shape (..., Zat, nt-1);
+    # returns n of shape (..., Zat+1, nt) (the last charge state cannot be ionized further)
+    Zat = W.shape[-2]
+    a = ones( W.shape[:-2]+(Zat+1, W.shape[-1]) )
+    a[...,:Zat,:] = (1.-W*dt/2.)/(1.+W*dt/2.)
+    b = W*dt/(1.+W*dt/2.)
+
+    # one charge state after the other
+    n = zeros( W.shape[:-2]+(Zat+1, W.shape[-1]+1) )
+    if n0 is None:
+        n[...,0,0] = 1.
+    else:
+        n[...,:,0] = n0
+    for Z in range(Zat+1):
+        source  = b[...,Z-1,:]*n[...,Z-1,:-1] if Z>0 else 0.*a[...,Z,:]
+        n[...,Z,1:] = _linear_scan_( a[...,Z,:], source, n[...,Z,0] )
+    return n
+
+
+def _expm_( A ):
+    # Matrix exponentials of a stack of matrices A (shape (N, m, m)), by scaling
+    # & squaring of a degree-14 Taylor expansion (norms scaled down to 1/2)
+    norm = abs(A).sum(axis=-2).max(axis=-1)
+    s    = ceil(log2( maximum(norm, 0.5)/0.5 )).astype(int)
+    A    = A / 2.**s[:,None,None]
+    term = zeros(A.shape); term[:,arange(A.shape[-1]),arange(A.shape[-1])] = 1.
+    P    = term.copy()
+    for k in range(1,15):
+        term = term @ A / k
+        P   += term
+    for i in range(s.max() if len(s) else 0):
+        square = flatnonzero( s>i )
+        P[square] = P[square] @ P[square]
+    return P
+
+
+# largest error of the closed-form propagators (estimated by _chain_propagators_), above
+# which they are computed by _expm_
+_CHAIN_TOLERANCE = 1.e-12
+
+def _chain_propagators_( Wh ):
+    # Closed-form propagators of the bidiagonal rate equations dn_0/dt = -W_0 n_0,
+    # dn_Z/dt = W_(Z-1) n_(Z-1) - W_Z n_Z for the rates frozen over a step h, with
+    # Wh = W*h of shape (N, Zat) (W_Zat = 0): with x = W*h, for i >= j,
+    #     P[i,j] = x_j*x_(j+1)*...*x_(i-1) * e[x_j,...,x_i]
+    # where e[...] are the divided differences of exp(-x), i.e. sums of the exp(-x_k).
+    # They are computed diagonal after diagonal by the recursion
+    #     P[i,j] = ( x_j*P[i,j+1] - x_(i-1)*P[i-1,j] ) / ( x_j - x_i ),
+    # which cancels when two rates of a chain are nearly equal: the rounding errors are
+    # propagated along, and the propagators with errors above _CHAIN_TOLERANCE are
+    # flagged in `inaccurate`. Rates below `tiny` are set to zero (they break the chain).
+    # The recursion stops at the last charge state reached by a non-zero rate, and the
+    # propagators are built with the matrices last (shape (Zat+1, Zat+1, N)) for speed.
+    tiny  = 1.e-18
+    eps   = 2.3e-16
+    N     = Wh.shape[0]
+    Zat   = Wh.shape[-1]
+    x     = zeros([Zat+1, N])
+    x[:Zat] = where( Wh > tiny, Wh, 0. ).T
+    nz    = flatnonzero( x.max(axis=1) > 0. )
+    last  = nz[-1]+1 if len(nz) else 0
+
+    P = zeros([Zat+1, Zat+1, N])
+    P[arange(Zat+1),arange(Zat+1)] = exp(-x)
+    error  = eps * P[:last+1,:last+1]         # bound of the rounding errors
+    linked = ones([last+1, N], dtype=bool)    # x_j ... x_(i-1) all non-zero
+    for d in range(1, last+1):
+        j, i   = arange(last+1-d), arange(d, last+1)
+        linked = linked[:-1] & (x[i-1] > 0.)
+        with errstate(divide='ignore', invalid='ignore'):
+            a, b = x[j]*P[i,j+1], x[i-1]*P[i-1,j]
+            gap  = abs( x[j] - x[i] )
+            Pij  = (a - b) / (x[j] - x[i])
+            Eij  = ( x[j]*error[i,j+1] + x[i-1]*error[i-1,j] + eps*(abs(a)+abs(b)) ) / gap
+        P    [i,j] = where( linked, Pij, 0. )
+        error[i,j] = where( linked, Eij, 0. )
+    inaccurate = ~( error.reshape(-1,N).max(axis=0) <= _CHAIN_TOLERANCE )
+    return P.transpose(2,0,1), inaccurate
+
+
+def _propagators_( Wh ):
+    # Exact propagators exp(-K*h) of the bidiagonal rate equations for the rates
+    # W frozen over a step h, with Wh = W*h of shape (..., Zat): in closed form
+    # (see _chain_propagators_), or by _expm_ when two rates of a chain are nearly equal;
+    # steps with negligible ionization (below `tiny`) are left unchanged
+    tiny   = 1.e-18
+    shape  = Wh.shape[:-1]
+    Zat    = Wh.shape[-1]
+    Z      = arange(Zat)
+    Wh     = Wh.reshape(-1, Zat)
+    active = flatnonzero( Wh.max(axis=-1) > tiny )
+
+    P = zeros([len(Wh), Zat+1, Zat+1]); P[:,arange(Zat+1),arange(Zat+1)] = 1.
+    P[active], inaccurate = _chain_propagators_( Wh[active] )
+    close = active[inaccurate]
+    if len(close):
+        K = zeros([len(close), Zat+1, Zat+1])
+        K[:,Z  ,Z] = -Wh[close]
+        K[:,Z+1,Z] =  Wh[close]
+        P[close] = _expm_( K )
+    return P.reshape( shape+(Zat+1, Zat+1) )
+
+
+def _half_cycle_propagators_( Eau, rates ):
+    # Exact propagators of the rate equations over one half-cycle of a linearly-polarized
+    # field, split into nsub sub-steps over which the rates are frozen. Eau (shape
+    # (nsteps, nsub)) is the field amplitude on each sub-step, and rates(Eau) the ADK
+    # rates (see _adk_rates_); returns the propagators,
+    # of shape (nsteps, Zat+1, Zat+1), and the rates averaged over the half-cycle
+    nsub  = Eau.shape[-1]
+    h     = pi/nsub
+    phase = (arange(nsub)+0.5)*h
+    W     = rates( Eau*sin(phase) )  # (nsteps, Zat, nsub)
+
+    Psub  = _propagators_( W.transpose(0,2,1)*h )
+
+    P = Psub[:,0]
+    for j in range(1,nsub):
+        P = Psub[:,j] @ P
+    return P, W.mean(axis=-1)
+
+
+def _merged_steps_( Env, rtol ):
+    # Step control driven by the envelope Env on successive intervals: consecutive intervals
+    # are merged into a single step as long as the envelope varies by less than rtol
+    # (relative to its peak). Returns the first interval & the number of intervals of each step.
+    Envmax = abs(Env).max() if len(Env) else 0.
+    if Envmax > 0.:
+        group = floor( concatenate([ [0.], cumsum(abs(diff(Env))) ]) / (rtol*Envmax) )
+        start = concatenate([ [0], flatnonzero(diff(group))+1 ]).astype(int)
+    else:
+        start = array([0])
+    return start, diff( concatenate([ start, [len(Env)] ]) )
+
+
+def _solve_exponential_( aL, Ec_to_au, delay, laser_time_envelope, tmax, rates, rtol, nsub=16 ):
+    # Exact integration of the rate equations over steps made of whole laser half-cycles,
+    # each split into nsub sub-steps with frozen rates. Consecutive half-cycles are merged
+    # into a single step as long as the envelope varies by less than rtol (relative to its
+    # peak): the envelope is then frozen to its mean value, and the propagator of one
+    # half-cycle is raised to the number of half-cycles in the step.
+    # The theory starts at the first zero of the field after the laser delay: the atoms
+    # are assumed neutral before, and the last incomplete half-cycle is not computed.
+
+    # half-cycle boundaries (zeros of sin(t))
+    kmin = int(ceil (delay/pi))
+    kmax = int(floor(tmax /pi))
+    tb   = arange(kmin, kmax+1)*pi
+
+    # envelope-driven step control
+    Envh     = laser_time_envelope( tb[:-1]+pi/2.-delay )
+    start, m = _merged_steps_( Envh, rtol )
+
+    # envelope on the sub-steps (frozen over merged half-cycles)
+    Envs = ( add.reduceat( Envh, start ) / m )[:,None] * ones(nsub)
+    single  = flatnonzero( m==1 )
+    Envs[single] = laser_time_envelope( tb[start[single],None] + (arange(nsub)+0.5)*pi/nsub - delay )
+
+    # exact solution of the bidiagonal system over each step
+    P, Ws = _half_cycle_propagators_( abs(aL*Envs)*Ec_to_au, rates )
+    n = zeros([Ws.shape[1]+1, len(m)+1]); n[0,0]=1.
+    for k in range(len(m)):
+        n[:,k+1] = matrix_power( P[k], int(m[k]) ) @ n[:,k]
+
+    t    = tb[concatenate([ start, [len(Envh)] ])]
+    Env  = laser_time_envelope( t-delay )
+    Wint = (Ws*m[:,None]).sum(axis=0)*pi / (tmax-delay)
+
+    return t, n, Env, Wint
+
+
+def _cycle_averaged_rates_( Eau, rates, gamma, polarization ):
+    # ADK rates averaged over a laser cycle, for the field amplitude Eau (shape (..., nt)),
+    # as in Smilei's "tunnel_envelope_averaged" ionization model: the rate at the peak
+    # field is reduced by sqrt(6/(pi*delta)) in linear polarization, and unchanged in
+    # circular polarization where the field modulus is constant over the cycle
+    W = rates( Eau )
+    if polarization == "linear":
+        W = W * sqrt( 6./pi * Eau[...,None,:] / gamma[...,:,None] )
+    return W
+
+
+def _solve_envelope_( aL, Ec_to_au, delay, laser_time_envelope, tmax, rates, gamma, polarization, envelope_step, rtol ):
+    # Exact integration of the rate equations with cycle-averaged rates on the laser time
+    # envelope, sampled every envelope_step. Consecutive samples are merged into a single
+    # step as long as the envelope varies by less than rtol (relative to its peak), the
+    # rates being frozen to their mean over the samples of the step (see _merged_steps_).
+    nsamples = max( 1, int(ceil( (tmax-delay)/envelope_step )) )
+    ts       = delay + arange(nsamples+1)*(tmax-delay)/nsamples
+    Envs     = laser_time_envelope( (ts[1:]+ts[:-1])/2.-delay )
+    start, m = _merged_steps_( Envs, rtol )
+
+    t    = ts[ concatenate([ start, [nsamples] ]) ]
+    h    = diff(t)
+    Env  = laser_time_envelope( t-delay )
+    W    = _cycle_averaged_rates_( abs(aL*Envs)*Ec_to_au, rates, gamma, polarization )
+    W    = add.reduceat( W, start, axis=1 ) / m
+
+    nsteps = len(h)
+    P = _propagators_( W.T*h[:,None] )
+    n = zeros([len(gamma)+1, nsteps+1]); n[0,0]=1.
+    for k in range(nsteps):
+        n[:,k+1] = P[k] @ n[:,k]
+
+    Wint = (W*h).sum(axis=1) / (tmax-delay)
+
+    return t, n, Env, Wint
+
+
+def _laser_polarization_( laser ):
+    # "linear" or "circular" polarization of a Laser block, from its two components
+    a1, a2    = abs(laser.space_envelope[0]), abs(laser.space_envelope[1])
+    dephasing = laser.delay_phase[1] - laser.delay_phase[0]
+    if min(a1, a2) < 1.e-10*max(a1, a2) or abs(sin(dephasing)) < 1.e-10:
+        return "linear"
+    if abs(a1-a2) < 1.e-10*max(a1, a2) and abs(cos(dephasing)) < 1.e-10:
+        return "circular"
+    raise ValueError('elliptical polarization is not supported by the rate equations')
+
+
+# Smilei time profiles (see pyprofiles.py in Smilei), evaluated on arrays of times:
+# the profile functions carry their name & parameters as attributes
+def _tconstant_( f, t ):
+    return where( t >= f.start, 1., 0. )
+
+def _ttrapezoidal_( f, t ):
+    t1 = f.start + f.slope1
+    t2 = t1 + f.plateau
+    return select( [t < f.start, t < t1, t < t2, t < t2+f.slope2],
+                   [0., (t-f.start)/f.slope1, 1., 1.-(t-t2)/f.slope2], 0. )
+
+def _tgaussian_( f, t ):
+    # Smilei keeps sigma (computed from fwhm); fwhm is only used by profiles built without it
+    sigma = f.sigma if hasattr(f, 'sigma') else (0.5*f.fwhm)**f.order / log(2.)
+    return where( (t >= f.start) & (t < f.start+f.duration), exp( -(t-f.center)**f.order / sigma ), 0. )
+
+def _tpolygonal_( f, t ):
+    # f.slopes[i-1] is the slope of the segment [points[i-1], points[i]]
+    points, values, slopes = array(f.points), array(f.values), array(f.slopes)
+    i = minimum( maximum( searchsorted(points, t, side='right'), 1 ), len(points)-1 )
+    return select( [t < points[0], t < points[-1]],
+                   [values[0], values[i-1] + slopes[i-1]*(t-points[i-1])], values[-1] )
+
+def _tcosine_( f, t ):
+    return where( (t >= f.start) & (t < f.start+f.duration),
+                  f.base + f.amplitude * cos( f.phi + f.freq*(t-f.start) ), 0. )
+
+def _tpolynomial_( f, t ):
+    return sum( c * (t-f.t0)**order for order, c in zip(f.orders, f.coeffs) ) + 0.*t
+
+def _tsin2plateau_( f, t ):
+    t1 = f.start + f.slope1
+    t2 = t1 + f.plateau
+    return select( [t < f.start, (t < t1) & (f.slope1 != 0.), t < t2, (t < t2+f.slope2) & (f.slope2 != 0.)],
+                   [0., sin(0.5*pi*(t-f.start)/f.slope1)**2, 1., cos(0.5*pi*(t-t2)/f.slope2)**2], 0. )
+
+_TIME_PROFILES = {
+    "tconstant"   : _tconstant_,
+    "ttrapezoidal": _ttrapezoidal_,
+    "tgaussian"   : _tgaussian_,
+    "tpolygonal"  : _tpolygonal_,
+    "tcosine"     : _tcosine_,
+    "tpolynomial" : _tpolynomial_,
+    "tsin2plateau": _tsin2plateau_,
+}
+
+def _time_profile_( f ):
+    # Version of the time profile f evaluated on whole arrays of times: analytic for the
+    # Smilei profiles (checked against f at ~64 times of each array), np.vectorize otherwise
+    vectorized = vectorize( f, otypes=[float] )
+    profile    = _TIME_PROFILES.get( getattr(f, 'profileName', None) )
+    if profile is None:
+        return vectorized
+
+    def evaluate( t ):
+        t = array( t, dtype=float )
+        try:
+            with errstate(all='ignore'):
+                p = array( profile(f, t), dtype=float )
+            nonzero = flatnonzero(p)
+            check   = concatenate([ nonzero[::max(1, len(nonzero)//32)], linspace(0, p.size-1, 32).astype(int) ])
+            if p.size and not allclose( p.flat[check], vectorized(t.flat[check]), rtol=1.e-10, atol=1.e-14 ):
+                raise ValueError
+        except (AttributeError, TypeError, ValueError, IndexError, OverflowError):
+            return vectorized( t )
+        return p
+
+    return evaluate
+
+
+def _kept_samples_( it, nt, every ):
+    # Mask of the time-step indices `it` that are output: one out of `every`
+    # and the last one (only the last one if every is None)
+    if every is None:
+        return it == nt-1
+    return (it % every == 0) | (it == nt-1)
+
+
+def _solve_crank_nicolson_( aL, Ec_to_au, delay, laser_time_envelope, nt, dt, rates, nstates, every, chunk_size ):
+    # Crank-Nicolson solution on the PIC time-steps, computed by chunks of chunk_size
+    # time-steps: each chunk starts from the last populations of the previous one, so that
+    # the field & rates of the whole run are never stored. Yields (t, n, Env, Wsum) for
+    # each chunk, with the samples kept by _kept_samples_ & the sum of the chunk rates.
+    nlast = zeros(nstates); nlast[0] = 1.
+    for start in range(0, nt, chunk_size):
+        it   = arange(start, min(start+chunk_size, nt))
+        t    = it*dt + delay
+        Env  = zeros(len(it))
+        E    = zeros(len(it))
+        # the first sample of the run is the initial state
+        new  = slice(1 if start==0 else 0, None)
+        if start == 0:
+            t[0] = 0.
+        Env[new] = laser_time_envelope(t[new]-delay)
+        E[new]   = aL*sin(t[new]) * Env[new]
+
+        # ADK rates for all charge states & time-steps of the chunk
+        W    = rates( abs(E[new])*Ec_to_au )
+        n    = _integrate_cn_( W, dt, nlast )[:,-len(it):]
+        nlast = n[:,-1]
+
+        keep = _kept_samples_( it, nt, every )
+        yield t[keep], n[:,keep], Env[keep], W.sum(axis=1)
+
+
+def _rate_eqs_setup_( namelist, rate_table ):
+    # Quantities read from the namelist by the solvers: laser parameters (in the order
+    # of the _solve_*_ arguments), PIC time-steps, charge states, ADK rates & coefficients
+
+    # conversion factor (between code units & atomic units)
+    w_ref    = namelist.Main.reference_angular_frequency_SI
+    Ec_to_au = 3.314742578e-15 * w_ref
+
+    # laser
+    aL  = max( namelist.Laser[0].space_envelope[0], namelist.Laser[0].space_envelope[1] )
+    Eau = aL * Ec_to_au
+    delay = namelist.Laser[0].delay_phase[1] / namelist.Laser[0].omega
+    laser_time_envelope = _time_profile_( namelist.Laser[0].time_envelope )
+
+    # PIC time-teps
+    dt = namelist.Main.timestep
+    nt = int(namelist.Main.simulation_time / dt)
+    print('********** ')
+    print('- [theory] dt = '+str(dt / w_ref * 1.0e15)+' fs')
+    print(' ')
+
+    # Atom properties (from the initial charge to the maximum charge state of the species)
+    Zat, Z0, Zmax = _charge_states_( namelist.Species[0] )
+    cst, alpha, beta, gamma = _adk_coefficients_( Zat, w_ref, Z0, Zmax )
+    Wadk  = sqrt(6./pi) * beta * (gamma/Eau)**(cst-1.5) * exp(-1./3. * gamma/Eau)
+    if rate_table:
+        table = adk_rate_table_( Zat, w_ref, Z0, Zmax )
+        rates = lambda Eau: _tabulated_rates_( Eau, table )
+    else:
+        rates = lambda Eau: _adk_rates_( Eau, alpha, beta, gamma )
+
+    laser = (aL, Ec_to_au, delay, laser_time_envelope)
+    return w_ref, laser, dt, nt, (Zat, Z0, Zmax), Wadk, gamma, rates
+
+
+def solve_rate_eqs_( namelist, integrator="crank_nicolson", rtol=1.e-3,
+                     model="tunnel", polarization=None, envelope_step=pi/8., rate_table=False,
+                     every=1, final_only=False, chunk_size=None ):
+    # integrator = "crank_nicolson": the rate equations are solved at every PIC time-step
+    # integrator = "exponential"   : the rate equations are solved exactly over steps
+    #                                spanning whole laser half-cycles, merged while the
+    #                                envelope varies by less than rtol (see _solve_exponential_)
+    # model = "tunnel"                  : the laser oscillations are resolved (linear polarization)
+    # model = "tunnel_envelope_averaged": cycle-averaged rates are integrated on the time envelope,
+    #                                     sampled every envelope_step, over steps merged while
+    #                                     the envelope varies by less than rtol (the integrator
+    #                                     is ignored); the polarization ("linear" or "circular")
+    #                                     is read from the Laser block unless given
+    # rate_table = True: the ADK rates are interpolated in a table cached on disk
+    #                    (see adk_rate_table_) instead of being computed exactly
+    # every = k        : only one sample out of k (and the last one) is returned
+    #                    (for the exponential & envelope models, one step out of k)
+    # final_only = True: only the last sample is returned
+    # The Crank-Nicolson integration proceeds by chunks of chunk_size time-steps (by default,
+    # ~2**22 populations), so that the memory used only depends on the samples returned.
+
+    w_ref, laser, dt, nt, (Zat, Z0, Zmax), Wadk, gamma, rates = _rate_eqs_setup_( namelist, rate_table )
+    aL, Ec_to_au, delay, laser_time_envelope = laser
+    if final_only:
+        every = None
+
+    if model == "tunnel_envelope_averaged":
+        if polarization is None:
+            polarization = _laser_polarization_( namelist.Laser[0] )
+        t, n, Env, Wint = _solve_envelope_( aL, Ec_to_au, delay, laser_time_envelope, delay+(nt-1)*dt,
+                                            rates, gamma, polarization, envelope_step, rtol )
+        keep = _kept_samples_( arange(len(t)), len(t), every )
+        t, n, Env = t[keep], n[:,keep], Env[keep]
+        print('- [theory] cycle-averaged rates ('+polarization+' polarization): '+str(len(t)-1)+' steps')
+
+    elif model != "tunnel":
+        raise ValueError('model must be "tunnel" or "tunnel_envelope_averaged", not '+repr(model))
+
+    elif integrator == "exponential":
+        t, n, Env, Wint = _solve_exponential_( aL, Ec_to_au, delay, laser_time_envelope,
+                                               delay+(nt-1)*dt, rates, rtol )
+        keep = _kept_samples_( arange(len(t)), len(t), every )
+        t, n, Env = t[keep], n[:,keep], Env[keep]
+        print('- [theory] exponential integrator: '+str(len(t)-1)+' steps')
+
+    elif integrator == "crank_nicolson":
+        if chunk_size is None:
+            chunk_size = max( 1024, 2**22 // (Zmax-Z0+1) )
+        chunks = list( _solve_crank_nicolson_( *laser, nt, dt, rates, Zmax-Z0+1, every, chunk_size ) )
+        t, n, Env = [ concatenate([chunk[i] for chunk in chunks], axis=-1) for i in range(3) ]
+        Wint = sum( chunk[3] for chunk in chunks ) / nt
+
+    else:
+        raise ValueError('integrator must be "crank_nicolson" or "exponential", not '+repr(integrator))
+
+    _print_summary_( Wadk, Wint, n, w_ref, Z0 )
+
+    # populations of all charge states, from 0 to Zat
+    nall = zeros([Zat+1, n.shape[-1]])
+    nall[Z0:Zmax+1] = n
+
+    return t, nall, Env
+
+
+def solve_rate_eqs_chunks_( namelist, every=1, chunk_size=None, rate_table=False ):
+    # Generator version of solve_rate_eqs_ (Crank-Nicolson integrator): yields the solution
+    # as successive (t, n, Env) chunks of chunk_size PIC time-steps, n holding the populations
+    # of all charge states from 0 to Zat, keeping one sample out of `every` (and the last one)
+
+    w_ref, laser, dt, nt, (Zat, Z0, Zmax), Wadk, gamma, rates = _rate_eqs_setup_( namelist, rate_table )
+    if chunk_size is None:
+        chunk_size = max( 1024, 2**22 // (Zmax-Z0+1) )
+
+    Wint = zeros(Zmax-Z0)
+    for t, n, Env, Wsum in _solve_crank_nicolson_( *laser, nt, dt, rates, Zmax-Z0+1, every, chunk_size ):
+        Wint += Wsum / nt
+        nall = zeros([Zat+1, n.shape[-1]])
+        nall[Z0:Zmax+1] = n
+        yield t, nall, Env
+
+    _print_summary_( Wadk, Wint, n, w_ref, Z0 )
+
+
+def solve_rate_eqs_sweep_( namelist, aL, w_ref, batch_size=None ):
+    # Final charge-state populations for arrays of peak vector potentials `aL`
+    # and of reference angular frequencies `w_ref` (in rad/s), broadcast together.
+    # The time-step, duration & laser time envelope are those of the namelist.
+    # Returns an array of shape (n_params, Zat+1).
+
+    aL, w_ref = broadcast_arrays( atleast_1d(aL).astype(float), atleast_1d(w_ref).astype(float) )
+    aL    = aL.ravel()
+    w_ref = w_ref.ravel()
+
+    # laser
+    delay = namelist.Laser[0].delay_phase[1] / namelist.Laser[0].omega
+    laser_time_envelope = _time_profile_( namelist.Laser[0].time_envelope )
+
+    # PIC time-teps
+    dt = namelist.Main.timestep
+    nt = int(namelist.Main.simulation_time / dt)
+    t  = arange(1,nt)*dt + delay
+    E  = sin(t) * laser_time_envelope(t-delay)
+
+    # Parameters are solved by batches holding at most ~2**24 rates
+    Zat, Z0, Zmax = _charge_states_( namelist.Species[0] )
+    if batch_size is None:
+        batch_size = max( 1, 2**24 // ((Zmax-Z0)*nt) )
+
+    nfinal = zeros([len(aL), Zat+1])
+    for start in range(0, len(aL), batch_size):
+        batch = slice(start, start+batch_size)
+        Ec_to_au = 3.314742578e-15 * w_ref[batch,None]
+        cst, alpha, beta, gamma = _adk_coefficients_( Zat, w_ref[batch,None], Z0, Zmax )
+        W    = _adk_rates_( abs(aL[batch,None]*E[None,:])*Ec_to_au, alpha, beta, gamma )
+        nfinal[batch,Z0:Zmax+1] = _integrate_cn_( W, dt )[...,-1]
+
+    return nfinal
+
+
+def solve_rate_eqs_scalar_( namelist ):
+    # Reference implementation: one python iteration per PIC time-step
 
     # control parameter
     tiny = 1.e-18
-    
+
     # conversion factor (between code units & atomic units)
     w_ref    = namelist.Main.reference_angular_frequency_SI
-    Lmu      = 2.*pi * 3.e8/(w_ref*1.e-6)
-    au_to_w0 = 4.134137172e+16 / w_ref
     Ec_to_au = 3.314742578e-15 * w_ref
-    
+
     # laser
     aL  = max( namelist.Laser[0].space_envelope[0], namelist.Laser[0].space_envelope[1] )
     Eau = aL * Ec_to_au
@@ -29,68 +664,49 @@ def solve_rate_eqs_( namelist ):
     print('********** ')
     print('- [theory] dt = '+str(dt / w_ref * 1.0e15)+' fs')
     print(' ')
-    
-    # Carbon atom properties
+
+    # Atom properties
     Zat = namelist.Species[0].atomic_number
-    Z   = arange(0, Zat)
-    Ip  = array([11.2602, 24.3845, 47.8877, 64.4935, 392.0905, 489.9931])/27.2114
-    l   = array([1,1,0,0,0,0])
-    
-    nstar = (Z+1.) * sqrt(1./2./Ip)
-    cst   = 2. * nstar
-    alpha = cst - 1.
-    beta  = 2.**(cst-1.)/cst/math_gamma(cst) * (8.*l+4.) * Ip * au_to_w0
-    gamma = 2.*(2.*Ip)**1.5
+    cst, alpha, beta, gamma = _adk_coefficients_( Zat, w_ref )
     Wadk  = sqrt(6./pi) * beta * (gamma/Eau)**(cst-1.5) * exp(-1./3. * gamma/Eau)
-    
+
     # Preparing arrays
     t    = zeros(nt)
     E    = zeros(nt)
     n    = zeros([Zat+1,nt]); n[0,0]=1.
     Wint = zeros(Zat)
     Env  = zeros(nt)
-    
+
     # Solving the rate equations numerically
     for it in range(1,nt):
         t[it]   = it*dt+delay
         E[it]   = aL*sin(t[it]) * laser_time_envelope(t[it]-delay)
         Env[it] = laser_time_envelope(t[it]-delay)
-    
+
         # neutral atom
         delta  = gamma[0]/( abs(E[it])*Ec_to_au)
         if (delta>tiny):
             W        = beta[0] * delta**alpha[0] * exp(-delta/3.)
             Wint[0] += W
             n[0,it]  = (1.-W*dt/2.)/(1.+W*dt/2.) * n[0,it-1]
-    
+
         # from charge 1 to charge Zat-1
         for Z in range(1,Zat):
-            deltam    = gamma[Z-1]/( abs(E[it])*Ec_to_au) 
-            deltap    = gamma[Z]  /( abs(E[it])*Ec_to_au) 
+            deltam    = gamma[Z-1]/( abs(E[it])*Ec_to_au)
+            deltap    = gamma[Z]  /( abs(E[it])*Ec_to_au)
             if (deltam>tiny) and (deltap>tiny):
                 Wm       = beta[Z-1] * (deltam)**alpha[Z-1] * exp(-deltam/3.)
                 Wp       = beta[Z  ] * (deltap)**alpha[Z  ] * exp(-deltap/3.)
                 Wint[Z] += Wp
                 n[Z,it]  = (1.-Wp*dt/2.)/(1.+Wp*dt/2.)*n[Z,it-1] + Wm*dt/(1.+Wm*dt/2.)*n[Z-1,it-1]
-    
+
         # last charge state
         delta = gamma[Zat-1]/( abs(E[it])*Ec_to_au)
         if (delta>tiny):
             W          = beta[Zat-1] * (delta)**alpha[Zat-1] * exp(-delta/3.)
             n[Zat,it]  = n[Zat,it-1]+W*dt/(1.+W*dt/2.)*n[Zat-1,it-1]
-    
-    # Compare ionisation rates
+
     Wint = Wint/nt
-    for Z in range(Zat):
-        print('- [theory] Z ='+str(Z)+'->'+str(Z+1)
-              +'    Wadk='+str(Wadk[Z]* w_ref)
-              +'    W   ='+str(Wint[Z] * w_ref)
-        )
-    
-    nsum = sum( n[:,-1] )
-    print(' ')
-    print('- [theory] test cons. part. nb:'+str(nsum))
-    print('********** ')
-    
-    return t, n, Env
+    _print_summary_( Wadk, Wint, n, w_ref )
 
+    return t, n, Env
@@ -0,0 +1,118 @@
+######################################################################
+### PROFILES SAMPLED ONCE ON A GRID & INTERPOLATED                  ###
+######################################################################
+
+# Smilei evaluates the Python profiles of a namelist each time plasma is created, e.g.
+# at each shift of the moving window. tabulate_profile_ samples a profile once on a
+# regular grid (at the cell resolution or finer) and returns a callable with the same
+# signature, that interpolates the table linearly (on arrays of positions, as Smilei
+# calls vectorized profiles). Outside the grid, the original profile is called.
+# For example, for the smooth (Fermi-like) longitudinal part of the profile of
+# laser_wake_envelope.py, sampled every quarter of a cell over the gas cell:
+#
+#     from tabulated_profile import tabulate_profile_
+#     dens_e = tabulate_profile_( lambda x: dens_func_e(x, 0.), [(p_xmin/c_over_omega0, p_xmax/c_over_omega0, dx/4.)] )
+#     print( dens_e.report() )
+#     def density_profile_electrons(x,r):
+#         return np.where( (r>R_plasma) | (x<p_xmin/c_over_omega0), 0., dens_e(x)*n_at )
+#
+# Linear interpolation smooths steps over one interval of the grid: steps along
+# coordinates that are not tabulated (as the radius above) are better kept analytic.
+# The table is stored in float32 by default (dtype), i.e. with a relative precision of 1e-7.
+
+import numpy as np
+
+
+def _evaluate_( profile, coordinates ):
+    # Profile at the positions given by arrays of coordinates (called on arrays if it can be)
+    try:
+        values = np.asarray( profile( *coordinates ), dtype=float )
+        if values.shape == np.shape( coordinates[0] ):
+            return values
+    except (TypeError, ValueError):
+        pass
+    return np.vectorize( profile, otypes=[float] )( *coordinates )
+
+
+class TabulatedProfile( object ):
+    # Callable interpolating a profile sampled on a regular grid
+
+    def __init__( self, profile, grid, dtype=np.float32, slab=256 ):
+        # grid: (min, max, step) along each coordinate of the profile
+        self.profile = profile
+        self.start   = np.array([ g[0] for g in grid ], dtype=float)
+        self.number  = np.array([ int(np.ceil( (g[1]-g[0])/g[2] - 1e-9 )) + 1 for g in grid ])
+        self.step    = np.array([ (g[1]-g[0])/(n-1) if n > 1 else 1. for g, n in zip(grid, self.number) ])
+        self.stop    = self.start + self.step*(self.number-1)
+        self.table   = np.empty( tuple(self.number), dtype=dtype )
+        axes = [ s + d*np.arange(n) for s, d, n in zip(self.start, self.step, self.number) ]
+        # sampled by slabs along the first coordinate, to bound the memory of the coordinates
+        for i in range( 0, self.number[0], slab ):
+            coordinates = np.meshgrid( axes[0][i:i+slab], *axes[1:], indexing='ij' )
+            self.table[i:i+slab] = _evaluate_( profile, coordinates )
+        # in 1D, differences between successive points, for the interpolation
+        self.slopes  = np.diff( self.table ) if len(grid) == 1 and self.number[0] > 1 else np.zeros( 1, dtype )
+
+    def __call__( self, *coordinates ):
+        scalar      = all( np.ndim(c) == 0 for c in coordinates )
+        coordinates = np.broadcast_arrays( *[ np.asarray(c, dtype=float) for c in coordinates ] )
+        if coordinates[0].size and all( c.min() >= start and c.max() <= stop
+                                        for c, start, stop in zip( coordinates, self.start, self.stop ) ):
+            # all the positions in the grid (e.g. a patch in the plasma): no masks
+            result = self._interpolate_( [ c.ravel() for c in coordinates ] ).reshape( coordinates[0].shape )
+            return float( result ) if scalar else result
+        inside      = np.ones( coordinates[0].shape, dtype=bool )
+        for c, start, stop in zip( coordinates, self.start, self.stop ):
+            inside &= (c >= start) & (c <= stop)
+
+        result = np.empty( coordinates[0].shape )
+        result[inside] = self._interpolate_( [ c[inside] for c in coordinates ] )
+        if not inside.all():
+            result[~inside] = _evaluate_( self.profile, [ c[~inside] for c in coordinates ] )
+        return float( result ) if scalar else result
+
+    def _interpolate_( self, points ):
+        # Multilinear interpolation, summed over the 2^d corners of the grid cells
+        # (in 1D, directly between the two neighbouring points)
+        if len( points ) == 1:
+            position  = (points[0] - self.start[0]) / self.step[0]
+            i         = position.astype( np.intp )
+            position -= i
+            position *= self.slopes.take( i, mode='clip' )
+            position += self.table.take( i, mode='clip' )
+            return position
+        index   = []
+        weights = []
+        for c, start, step, n in zip( points, self.start, self.step, self.number ):
+            position = (c - start) / step
+            i = np.clip( np.floor( position ).astype(int), 0, max(n-2, 0) )
+            index  .append( i )
+            weights.append( position - i )
+        values = np.zeros( len(points[0]) )
+        for corner in range( 2**len(points) ):
+            shift  = [ (corner >> d) & 1 for d in range(len(points)) ]
+            weight = np.ones( len(points[0]) )
+            for d, s in enumerate( shift ):
+                weight *= weights[d] if s else 1. - weights[d]
+            values += weight * self.table[ tuple( np.minimum(i+s, n-1) for i, s, n in zip(index, shift, self.number) ) ]
+        return values
+
+    def errors( self, samples=100000, seed=0 ):
+        # Largest & rms differences with the original profile, at random positions in the grid,
+        # relative to the largest absolute value of the table
+        rng         = np.random.default_rng( seed )
+        coordinates = [ rng.uniform( start, stop, samples ) for start, stop in zip(self.start, self.stop) ]
+        difference  = self( *coordinates ) - _evaluate_( self.profile, coordinates )
+        scale       = np.abs( self.table ).max() or 1.
+        return dict( max=np.abs(difference).max()/scale, rms=np.sqrt((difference**2).mean())/scale )
+
+    def report( self, samples=100000 ):
+        errors = self.errors( samples )
+        return ( 'tabulated profile: %s points (%.3g MB), largest error %.3g, rms error %.3g (relative to the maximum)'
+                 % ( ' x '.join(str(n) for n in self.number), self.table.nbytes/1e6, errors['max'], errors['rms'] ) )
+
+
+def tabulate_profile_( profile, grid, dtype=np.float32 ):
+    # Profile sampled on the grid [(min, max, step) along each coordinate], as a callable
+    # with the same coordinates
+    return TabulatedProfile( profile, grid, dtype )
@@ -0,0 +1,88 @@
+##############################################################
+### CACHE OF THE TIMESTEPS READ BY HAPPI FOR slide()        ###
+##############################################################
+
+# happi reads the data of a timestep from the disk each time it is displayed, e.g. at
+# each move of the slider of slide() or multiSlide(). TimestepCache keeps the timesteps
+# already read in memory (the least recently used being discarded above max_bytes), and
+# reads the `prefetch` timesteps around the one displayed in a background thread:
+#
+#     cache = TimestepCache( max_bytes=2**30 )
+#     rho   = cache.open_( S.Probe, 1, "-Rho", units=["um","pC/cm^3"] )
+#     ex    = cache.open_( S.Probe, 1, "Ex",   units=["um","GV/m"] )
+#     happi.multiSlide( rho, ex )
+#
+# The diagnostics opened by open_ with the same arguments share their cached timesteps;
+# wrap_ adds the cache to a diagnostic already opened. The cache replaces the method
+# _getDataAtTime of the diagnostics, through which happi reads the data of a timestep.
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+class TimestepCache( object ):
+
+    def __init__( self, max_bytes=2**30, prefetch=2 ):
+        self.max_bytes = max_bytes
+        self.prefetch  = prefetch
+        self.nbytes    = 0
+        self._arrays   = OrderedDict()   # (key, timestep) -> array, least recently used first
+        self._lock     = threading.Lock()
+        self._loading  = {}              # key -> lock held while the diagnostic reads a timestep
+        self._current  = {}              # key -> index of the timestep displayed last
+        self._executor = ThreadPoolExecutor( max_workers=1 )
+
+    def open_( self, factory, *args, **kwargs ):
+        # Opens the diagnostic factory(*args, **kwargs) (e.g. S.Probe) with the cache
+        key = ( id(factory), args, tuple(sorted( (k, repr(v)) for k, v in kwargs.items() )) )
+        return self.wrap_( factory(*args, **kwargs), key )
+
+    def wrap_( self, diag, key=None ):
+        # Adds the cache to a happi diagnostic; the diagnostics with the same key share their timesteps
+        key   = id(diag) if key is None else key
+        read  = diag._getDataAtTime
+        steps   = list( diag.getTimesteps() )
+        indices = { t: i for i, t in enumerate(steps) }
+        self._loading.setdefault( key, threading.Lock() )
+        diag._getDataAtTime = lambda t: self._get_( key, read, steps, indices, t )
+        return diag
+
+    def _get_( self, key, read, steps, indices, t ):
+        data  = self._load_( key, read, t )
+        index = indices.get( t )
+        if index is not None and self.prefetch > 0:
+            self._current[ key ] = index
+            # neighbours, the nearest first
+            for d in range( 1, self.prefetch+1 ):
+                for i in ( index+d, index-d ):
+                    if 0 <= i < len(steps) and (key, steps[i]) not in self._arrays:
+                        self._executor.submit( self._prefetch_, key, read, steps, i )
+        return np.array( data ) if isinstance( data, np.ndarray ) else data
+
+    def _prefetch_( self, key, read, steps, i ):
+        # Skipped when the slider moved away from this timestep since it was requested
+        if abs( i - self._current.get(key, i) ) <= self.prefetch:
+            self._load_( key, read, steps[i] )
+
+    def _load_( self, key, read, t ):
+        with self._loading[ key ]:
+            with self._lock:
+                if (key, t) in self._arrays:
+                    self._arrays.move_to_end( (key, t) )
+                    return self._arrays[ (key, t) ]
+            data = read( t )
+            if not isinstance( data, np.ndarray ):
+                return data
+            with self._lock:
+                self._arrays[ (key, t) ] = data
+                self.nbytes += data.nbytes
+                while self.nbytes > self.max_bytes and len(self._arrays) > 1:
+                    self.nbytes -= self._arrays.popitem( last=False )[1].nbytes
+            return data
+
+    def clear( self ):
+        with self._lock:
+            self._arrays.clear()
+            self.nbytes = 0
@@ -0,0 +1,110 @@
+######################################################################
+### INDEX OF THE PARTICLE IDS OF AN UNSORTED TRACKPARTICLES OUTPUT  ###
+######################################################################
+
+# Without sorting (sort=False in happi), Smilei writes the tracked macro-particles of a
+# species in TrackParticlesDisordered_<species>.h5, one group data/<timestep>/particles/<species>
+# per output, in which the rows of a given macro-particle change from one output to the next.
+# build_track_index_ reads the ids of each output once and writes, for each output, the
+# (id, row) pairs sorted by id in a .npy file (and the timesteps & offsets of the outputs
+# in <filename>.steps.npy). The trajectories of selected macro-particles are then read
+# directly at their rows, in a time proportional to their number & to the number of outputs:
+#
+#     index = track_index_( "/path/to/simulation", "electron" )
+#     timesteps, data = trajectories_( "/path/to/simulation", "electron", ids, index=index )
+#     plt.plot( data["x"], data["px"] )
+
+import os
+import h5py
+import numpy as np
+from numpy.lib.format import open_memmap
+
+_DATASETS = dict( x="position/x", y="position/y", z="position/z", px="momentum/x", py="momentum/y",
+                  pz="momentum/z", w="weight", q="charge", chi="chi" )
+_PAIR     = np.dtype([ ("id", np.uint64), ("row", np.uint32) ])
+
+
+def _track_file_( results_path, species ):
+    return os.path.join( results_path, "TrackParticlesDisordered_%s.h5" % species )
+
+
+def _outputs_( f, species ):
+    # Sorted timesteps of the outputs & their groups of particles
+    timesteps = sorted( int(t) for t in f["data"] )
+    return timesteps, [ f["data/%010d/particles/%s" % (t, species)] for t in timesteps ]
+
+
+def build_track_index_( results_path, species, filename=None ):
+    # Writes the index of the ids of a tracked species (by default in the results directory),
+    # reading the ids of one output at a time
+    filename = filename or os.path.join( results_path, "TrackParticlesIndex_%s.npy" % species )
+    with h5py.File( _track_file_(results_path, species), "r" ) as f:
+        timesteps, groups = _outputs_( f, species )
+        sizes  = [ group["id"].shape[0] if "id" in group else 0 for group in groups ]
+        steps  = np.zeros( len(timesteps), dtype=[ ("timestep", np.int64), ("offset", np.int64) ] )
+        steps["timestep"] = timesteps
+        steps["offset"]   = np.cumsum( [0] + sizes[:-1] )
+        pairs  = open_memmap( filename+".tmp", mode="w+", dtype=_PAIR, shape=(sum(sizes),) )
+        for group, size, offset in zip( groups, sizes, steps["offset"] ):
+            if size == 0:
+                continue
+            ids   = group["id"][()]
+            order = np.argsort( ids, kind="stable" )
+            pairs["id"][offset:offset+size]  = ids[order]
+            pairs["row"][offset:offset+size] = order
+            pairs.flush()
+        del pairs
+    np.save( filename+".steps.npy", steps )
+    os.replace( filename+".tmp", filename )
+    return filename
+
+
+class TrackIndex( object ):
+    # Memory-mapped index of the ids of a tracked species
+    def __init__( self, filename ):
+        steps          = np.load( filename+".steps.npy" )
+        self.pairs     = np.load( filename, mmap_mode="r" )
+        self.timesteps = steps["timestep"]
+        self.offsets   = np.append( steps["offset"], len(self.pairs) )
+
+    def rows( self, ids ):
+        # Array (outputs, ids) of the rows of the ids in each output (-1 where absent)
+        ids  = np.asarray( ids, dtype=np.uint64 )
+        rows = np.full( (len(self.timesteps), len(ids)), -1, dtype=np.int64 )
+        for it in range( len(self.timesteps) ):
+            output = self.pairs[ self.offsets[it]:self.offsets[it+1] ]
+            if len(output) == 0:
+                continue
+            where = np.searchsorted( output["id"], ids )
+            where = np.minimum( where, len(output)-1 )
+            found = output["id"][where] == ids
+            rows[it, found] = output["row"][where[found]]
+        return rows
+
+
+def track_index_( results_path, species, filename=None ):
+    # Index of a tracked species, built when missing or older than the TrackParticles file
+    filename = filename or os.path.join( results_path, "TrackParticlesIndex_%s.npy" % species )
+    track    = _track_file_( results_path, species )
+    if not os.path.exists( filename ) or os.path.getmtime( filename ) < os.path.getmtime( track ):
+        build_track_index_( results_path, species, filename )
+    return TrackIndex( filename )
+
+
+def trajectories_( results_path, species, ids, attributes=("x","y","z","px","py","pz","w"), index=None ):
+    # (timesteps, data) where data[attribute] is an array (outputs, ids) of the attribute of the
+    # selected macro-particles (NaN when a macro-particle is absent from an output)
+    index = index or track_index_( results_path, species )
+    rows  = index.rows( ids )
+    data  = { a: np.full( rows.shape, np.nan ) for a in attributes }
+    with h5py.File( _track_file_(results_path, species), "r" ) as f:
+        for it, timestep in enumerate( index.timesteps ):
+            found = ( rows[it] >= 0 ).nonzero()[0]
+            if len(found) == 0:
+                continue
+            # h5py reads increasing, unique rows
+            selected, inverse = np.unique( rows[it, found], return_inverse=True )
+            group = f["data/%010d/particles/%s" % (timestep, species)]
+            for a in attributes:
+                data[a][it, found] = group[ _DATASETS.get(a, a) ][ selected ][ inverse ]
+    return index.timesteps, data
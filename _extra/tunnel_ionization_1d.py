@@ -1,5 +1,6 @@
 
 from math import pi, sqrt
+import numpy as np
 
 l0  = 2.*pi         # wavelength in normalized units
 t0  = l0            # optical cycle in normalized units
@@ -21,10 +22,7 @@ I18  = 5.0e-2
 aL   = sqrt(I18*Lmu**2/1.38)
 
 def n_(x):
-    if (Lv<x<Lv+Lp):
-        return n0
-    else:
-        return 0.
+    return np.where( (Lv<x) & (x<Lv+Lp), n0, 0. )
 
 Main(
     geometry = "1Dcartesian",